@@ -0,0 +1,335 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import clean_data
+import fetch_data
+import store
+from timing import process_rss
+
+# Ticker counts and trading days per ticker for the default scaling run.
+DEFAULT_TICKERS = (8, 64, 256)
+DEFAULT_DAYS = 504
+
+# What main() shows on first load: four companies over the last year.
+SHOWN_COMPANIES = 4
+SHOWN_DAYS = 365
+
+# Open dashboard sessions at each step of the session load test.
+DEFAULT_SESSIONS = (1, 10, 25, 50)
+SESSION_TICKERS = 256
+
+
+def synthetic_ohlcv(n_tickers, n_days, seed=0, end=None):
+    """
+    `n_tickers` x `n_days` of business-day bars in the raw schema that
+    fetch_stock_data() writes, from a seeded geometric random walk.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or datetime.now()).normalize()
+    dates = pd.bdate_range(end=end, periods=n_days)
+    n = n_tickers * n_days
+
+    drift = rng.normal(0.0003, 0.0005, n_tickers).repeat(n_days)
+    sigma = rng.uniform(0.01, 0.04, n_tickers).repeat(n_days)
+    steps = (drift + sigma * rng.standard_normal(n)).reshape(n_tickers, n_days)
+    start_price = rng.uniform(20, 500, n_tickers)[:, None]
+    close = (start_price * np.exp(np.cumsum(steps, axis=1))).ravel()
+    open_ = close * np.exp(sigma * rng.standard_normal(n) / 2)
+    spread = np.abs(sigma * rng.standard_normal(n)) / 2
+
+    return pd.DataFrame({
+        'Date': np.tile(dates.to_numpy(), n_tickers),
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.lognormal(16, 1, n).astype('int64'),
+        'Ticker': np.repeat([f'SYN{i:04d}' for i in range(n_tickers)], n_days),
+        'Company': np.repeat([f'Synthetic {i:04d}' for i in range(n_tickers)], n_days),
+    })
+
+
+def measure(fn, repeat):
+    """
+    Run `fn` once under tracemalloc for the peak of Python and NumPy
+    allocations (Arrow's own buffers are not traced), which also warms up
+    lazy imports, then `repeat` more times for timings. Output printed by
+    `fn` is swallowed.
+    """
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+    return {
+        'min_s': min(times),
+        'median_s': statistics.median(times),
+        'peak_mb': peak / 1e6,
+    }
+
+
+def _dashboard():
+    # Imported late: the module sets up the page and session state on
+    # import, which Streamlit warns about without `streamlit run` behind it.
+    from streamlit import config, logger
+    config.set_option('global.showWarningOnDirectExecution', False)
+    logger.set_log_level('error')
+    import dashboard
+    return dashboard
+
+
+def bench_size(n_tickers, n_days, repeat):
+    """Time every hot path on one synthetic universe in the current directory."""
+    dash = _dashboard()
+    raw = synthetic_ohlcv(n_tickers, n_days)
+    results = {}
+
+    source = fetch_data.FrameSource(raw)
+    tickers = dict(zip(raw['Ticker'].unique(), raw['Company'].unique()))
+    results['fetch'] = measure(
+        lambda: fetch_data.fetch_stock_data(tickers=tickers, source=source, rate=1e6), repeat)
+
+    store.write_raw(raw)
+    del source, raw
+    results['clean'] = measure(clean_data.clean_and_transform_data, repeat)
+
+    df = store.read_cleaned(columns=clean_data.SUMMARY_COLUMNS)
+    ytd = clean_data.compute_ytd_returns(df)
+    results['summary'] = measure(lambda: clean_data.create_summary_stats(df, ytd), repeat)
+    del df
+
+    version = store.data_version()
+
+    def load(in_memory):
+        dash.load_data.clear()
+        return dash.load_data(version, columns=dash.DASHBOARD_COLUMNS, in_memory=in_memory)
+    results['load_data:memory'] = measure(lambda: load(True), repeat)
+    results['load_data:query'] = measure(lambda: load(False), repeat)
+
+    queried = load(False)
+    data = load(True)
+    index = data.index
+    companies = tuple(sorted(index)[:SHOWN_COMPANIES])
+    end = data.last_date
+    start = end - pd.Timedelta(days=SHOWN_DAYS)
+
+    def filter_rows():
+        for company in companies:
+            dash.company_rows(index, company, start, end)
+        rows = data.table.index.get_indexer(companies)
+        data.table.iloc[np.sort(rows[rows >= 0])]
+    results['filter'] = measure(filter_rows, repeat)
+
+    for key, builder in dash.FIGURE_BUILDERS.items():
+        shown = companies[:1] if key == 'price_history' else companies
+        arg = shown[0] if key == 'price_history' else shown
+        results[f'figure:{key}'] = measure(lambda: builder(index, arg, start, end), repeat)
+
+        def query_figure():
+            bars = dash.view_index(queried, key, 'D', shown, start, end)
+            return builder(bars, arg, start, end)
+        results[f'query:{key}'] = measure(query_figure, repeat)
+        fig = builder(index, arg, start, end)
+        results[f'serialize:{key}'] = measure(fig.to_json, repeat)
+
+    stocks_data = list(data.records.values())
+
+    def watchlist_html():
+        # The document is memoized in the dashboard; clear it so every run
+        # times the builder rather than a cache hit.
+        dash._watchlist_document.cache_clear()
+        return dash.build_watchlist_html(stocks_data, set(companies[:1]))
+    results['watchlist_html'] = measure(watchlist_html, repeat)
+
+    return [{'case': case, 'tickers': n_tickers, 'days': n_days,
+             'rows': n_tickers * n_days, **r} for case, r in results.items()]
+
+
+DASHBOARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py')
+
+
+def _open_session(i, companies, in_memory):
+    from streamlit.testing.v1 import AppTest
+    os.environ['DASHBOARD_DATA'] = 'memory' if in_memory else 'query'
+    at = AppTest.from_file(DASHBOARD_SCRIPT, default_timeout=120)
+    at.query_params['debug'] = '1'
+    at.run()
+    # Every session picks its own companies and chart tab.
+    at.multiselect[0].set_value([companies[(i * 7 + k) % len(companies)] for k in range(4)])
+    at.radio[0].set_value(list(_dashboard().CHART_TABS)[i % 4]).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+@contextlib.contextmanager
+def synthetic_store(n_tickers, days):
+    """
+    Work in a scratch directory holding a cleaned synthetic universe, and
+    yield its company names. The repo's data/ is never touched.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('data')
+            raw = synthetic_ohlcv(n_tickers, days)
+            companies = sorted(raw['Company'].unique())
+            store.write_raw(raw)
+            del raw
+            with contextlib.redirect_stdout(io.StringIO()):
+                clean_data.clean_and_transform_data()
+            yield companies
+        finally:
+            os.chdir(cwd)
+
+
+def session_memory(session_counts=DEFAULT_SESSIONS, n_tickers=SESSION_TICKERS,
+                   days=DEFAULT_DAYS, in_memory=True):
+    """
+    Open more and more dashboard sessions on one synthetic universe in this
+    process, each with its own companies and chart tab, and keep them all
+    open. After each step, record the process RSS and the dashboard's own
+    memory report. If the sessions share the dataset, RSS stays flat while
+    the session count grows; only each session's small state adds up.
+    """
+    _dashboard()
+    steps = []
+    with synthetic_store(n_tickers, days) as companies:
+        sessions = []
+        for target in session_counts:
+            while len(sessions) < target:
+                sessions.append(_open_session(len(sessions), companies, in_memory))
+            report = json.loads(sessions[-1].json[-1].value)
+            steps.append({'sessions': target, 'rss_mb': process_rss() / 1e6,
+                          'shared_mb': report['shared_data_bytes'] / 1e6,
+                          'session_kb': report['session_state_bytes'] / target / 1e3})
+    return steps
+
+
+def print_sessions(steps):
+    print(f"{'sessions':>8}{'RSS MB':>10}{'+MB/session':>13}{'shared MB':>11}{'state KB/session':>18}")
+    first = steps[0]
+    for step in steps:
+        added = step['sessions'] - first['sessions']
+        growth = (step['rss_mb'] - first['rss_mb']) / added if added else 0.0
+        print(f"{step['sessions']:>8}{step['rss_mb']:>10.1f}{growth:>13.2f}"
+              f"{step['shared_mb']:>11.1f}{step['session_kb']:>18.2f}")
+
+
+def scaling(results):
+    """
+    Per case, the exponent k in time ~ rows^k between consecutive sizes:
+    about 1 is linear, below 1 means fixed costs still dominate.
+    """
+    curves = {}
+    for case in dict.fromkeys(r['case'] for r in results):
+        points = sorted((r['rows'], r['median_s']) for r in results if r['case'] == case)
+        curves[case] = [
+            round(math.log(t1 / t0) / math.log(n1 / n0), 2)
+            for (n0, t0), (n1, t1) in zip(points, points[1:])
+            if n1 != n0 and t0 > 0 and t1 > 0
+        ]
+    return curves
+
+
+def run(ticker_counts=DEFAULT_TICKERS, days=DEFAULT_DAYS, repeat=3):
+    """Benchmark every size in a scratch directory; the repo's data/ is never touched."""
+    cwd = os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('data')
+            for n in ticker_counts:
+                print(f"Benchmarking {n} tickers x {days} days.")
+                results.extend(bench_size(n, days, repeat))
+        finally:
+            os.chdir(cwd)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'results': results,
+        'scaling': scaling(results),
+    }
+
+
+def print_report(report, baseline=None):
+    base = {}
+    if baseline:
+        base = {(r['case'], r['rows']): r['median_s'] for r in baseline['results']}
+    header = f"{'case':<26}{'tickers':>8}{'rows':>10}{'median ms':>12}{'min ms':>10}{'peak MB':>10}"
+    print(header + ("  vs baseline" if base else ""))
+    for r in report['results']:
+        line = (f"{r['case']:<26}{r['tickers']:>8}{r['rows']:>10}"
+                f"{r['median_s'] * 1e3:>12.2f}{r['min_s'] * 1e3:>10.2f}{r['peak_mb']:>10.1f}")
+        old = base.get((r['case'], r['rows']))
+        if old:
+            line += f"  {r['median_s'] / old:>6.2f}x"
+        print(line)
+    print("\nScaling exponent between sizes (time ~ rows^k):")
+    for case, ks in report['scaling'].items():
+        print(f"  {case:<26}{', '.join(f'{k:.2f}' for k in ks)}")
+    print(f"\nProcess peak RSS: {report['max_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline benchmarks of the fetch, clean, load and render paths on synthetic data.")
+    parser.add_argument('--tickers', type=int, nargs='+', default=list(DEFAULT_TICKERS),
+                        help=f"ticker counts to run (default: {' '.join(map(str, DEFAULT_TICKERS))})")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS,
+                        help=f"trading days per ticker (default: {DEFAULT_DAYS})")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="timed runs per case (default: 3)")
+    parser.add_argument('--output', default='benchmark.json',
+                        help="where to save the results as JSON (default: benchmark.json)")
+    parser.add_argument('--compare', metavar='JSON',
+                        help="earlier results to show the median-time ratio against")
+    parser.add_argument('--sessions', type=int, nargs='+', metavar='N',
+                        help="instead, open N dashboard sessions at once for each N and "
+                             f"report memory (e.g. {' '.join(map(str, DEFAULT_SESSIONS))})")
+    parser.add_argument('--query', action='store_true',
+                        help="with --sessions, leave the bars on disk (DASHBOARD_DATA=query)")
+    args = parser.parse_args()
+
+    if args.sessions:
+        print_sessions(session_memory(args.sessions, args.tickers[-1], args.days,
+                                      in_memory=not args.query))
+        raise SystemExit
+
+    report = run(args.tickers, args.days, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=1)
+    print(f"Results saved to {args.output}")
@@ -1,77 +1,303 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 
-def clean_and_transform_data(input_file='data/stock_data_raw.csv'):
-    
-    print("Loading raw data.")
-    df = pd.read_csv(input_file)
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    df = df.sort_values(['Ticker', 'Date'])
-    
-    df['Daily_Return'] = df.groupby('Ticker')['Close'].pct_change() * 100
-    
-    df['Cumulative_Return'] = df.groupby('Ticker')['Close'].transform(
-        lambda x: ((x / x.iloc[0]) - 1) * 100
-    )
-    
-    df['MA_50'] = df.groupby('Ticker')['Close'].transform(
-        lambda x: x.rolling(window=50, min_periods=1).mean()
-    )
+import store
+from indicators import IndicatorState, compute_indicators
+from rollups import ROLLUPS, build_rollup, extend_rollup
 
-    df['MA_200'] = df.groupby('Ticker')['Close'].transform(
-        lambda x: x.rolling(window=200, min_periods=1).mean()
-    )
-    
-    df['Volatility_30D'] = df.groupby('Ticker')['Daily_Return'].transform(
-        lambda x: x.rolling(window=30, min_periods=1).std()
+# Columns create_summary_stats() and compute_ytd_returns() read.
+SUMMARY_COLUMNS = ['Date', 'Ticker', 'Company', 'Close', 'Volume',
+                   'Cumulative_Return', 'Volatility_30D']
+
+def compute_ytd_returns(df, current_year=None):
+    year = df['Date'].dt.year
+    if current_year is None:
+        current_year = year.max()
+    closes = (
+        df[year == current_year]
+        .groupby('Ticker', observed=True)['Close']
+        .agg(['first', 'last'])
     )
-    
-    df['Year'] = df['Date'].dt.year
-    df['Month'] = df['Date'].dt.month
-    df['Quarter'] = df['Date'].dt.quarter
-    df['Year_Month'] = df['Date'].dt.to_period('M').astype(str)
-    
-    current_year = df['Date'].dt.year.max()
-    ytd_start = df[df['Year'] == current_year].groupby('Ticker')['Close'].first()
-    ytd_latest = df[df['Year'] == current_year].groupby('Ticker')['Close'].last()
-    ytd_returns = ((ytd_latest / ytd_start) - 1) * 100
-    
-    df.to_csv('data/stock_data_cleaned.csv', index=False)
-    print(f"✓ Cleaned data saved! Total records: {len(df)}")
-    
-    create_summary_stats(df, ytd_returns)
-    
-    return df
+    return ((closes['last'] / closes['first']) - 1) * 100
+
+def transform(raw):
+    df = raw.sort_values(['Ticker', 'Date'])
+    return compute_indicators(df)
+
+# Tickers cleaned together. Peak memory scales with this, not with the
+# number of tickers in the store.
+CHUNK_TICKERS = 32
+
+def _chunks(tickers, size):
+    return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+def _clean_chunk(tickers, raw_dir, current_year):
+    """
+    Clean `tickers` end to end: read their raw partitions, compute the
+    indicators and write their cleaned partitions. Only the indicator state
+    tail and the summary rows are returned, so in parallel mode nothing
+    larger travels back to the parent process.
+    """
+    df = transform(store.read_raw(tickers=tickers, root=raw_dir))
+    store.write_cleaned(df, replace=False)
+    write_rollups(df)
+    ytd_returns = compute_ytd_returns(df, current_year)
+    return IndicatorState.from_frame(df).tail, summary_rows(df, ytd_returns), len(df)
+
+def clean_and_transform_data(raw_dir=store.RAW_DIR, workers=1, chunk_size=CHUNK_TICKERS):
+    """
+    Rebuild the cleaned store, the indicator state and the summary from the
+    raw store. Returns the number of cleaned rows.
+
+    Tickers are processed in sorted chunks of `chunk_size`. Each chunk is
+    read, cleaned and written before the next one is read, so peak memory is
+    bounded by the chunk, not the universe. With workers > 1 the chunks run
+    in a ProcessPoolExecutor. Every indicator is computed per ticker, and
+    results are merged in ticker order. The one global input, the current
+    year for YTD returns, is taken from the raw store's last date up front.
+    The output is therefore byte-identical for any `workers` and `chunk_size`.
+    """
+    tickers = store.tickers(raw_dir)
+    if not tickers:
+        print("No raw data found.")
+        return 0
+    current_year = store.last_dates(raw_dir).max().year
+    chunks = _chunks(tickers, chunk_size)
+    args = (chunks, [raw_dir] * len(chunks), [current_year] * len(chunks))
+    on = f" on {workers} processes" if workers > 1 else ""
+    print(f"Cleaning {len(tickers)} tickers in {len(chunks)} chunks{on}.")
+
+    store.clear_partitions(store.CLEANED_DIR)
+    for root in store.ROLLUP_DIRS.values():
+        store.clear_partitions(root)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_clean_chunk, *args))
+    else:
+        results = list(map(_clean_chunk, *args))
+
+    tails, rows, counts = zip(*results)
+    store.write_state(pd.concat(tails, ignore_index=True))
+    print(f"✓ Cleaned data saved to {store.CLEANED_DIR}/! Total records: {sum(counts)}")
+
+    write_summary(pd.concat(rows, ignore_index=True))
+    store.write_manifest()
+    return sum(counts)
+
+def write_rollups(df):
+    """Replace the weekly and monthly bars of every ticker in `df` (sorted by Ticker, Date)."""
+    for freq in ROLLUPS:
+        store.write_rollup(build_rollup(df, freq), freq, replace=False)
+
+def summarize_cleaned(chunk_size=CHUNK_TICKERS):
+    """Rebuild the summary from the cleaned store, one chunk of tickers at a time."""
+    current_year = store.date_bounds(store.CLEANED_DIR)[1].year
+    rows = []
+    for chunk in _chunks(store.tickers(store.CLEANED_DIR), chunk_size):
+        df = store.read_cleaned(columns=SUMMARY_COLUMNS, tickers=chunk)
+        rows.append(summary_rows(df, compute_ytd_returns(df, current_year)))
+    write_summary(pd.concat(rows, ignore_index=True))
+
+def update_cleaned_data(raw_dir=store.RAW_DIR):
+    """
+    Incremental path: compute indicator rows only for raw bars newer than the
+    cleaned store and append them as new part files.
+
+    The rolling windows are continued from the per-ticker state saved with
+    the last run. If there is no state yet, this falls back to a full
+    clean_and_transform_data(). Tickers are handled CHUNK_TICKERS at a time,
+    so memory stays bounded by the chunk rather than the universe.
+    """
+    tail = store.read_state()
+    if tail is None:
+        print("No indicator state found, running a full recompute.")
+        return clean_and_transform_data(raw_dir)
+    last = IndicatorState(tail).last_dates()
+    tickers = store.tickers(raw_dir)
+    current_year = store.last_dates(raw_dir).max().year
+
+    tails = [tail[~tail['Ticker'].isin(tickers)]]
+    changed, appended = [], 0
+    for chunk in _chunks(tickers, CHUNK_TICKERS):
+        chunk_tail = tail[tail['Ticker'].isin(chunk)]
+        new = _new_bars(chunk, last, raw_dir)
+        if new.empty:
+            tails.append(chunk_tail)
+            continue
+        state = IndicatorState(chunk_tail)
+        rows = state.extend(new)
+        tails.append(state.tail)
+        store.append_cleaned(rows)
+        appended += len(rows)
+
+        names = sorted(rows['Ticker'].unique())
+        for freq in ROLLUPS:
+            last_bars = store.last_rollup_bars(freq, names)
+            store.update_rollup(extend_rollup(last_bars, rows, freq), freq)
+        df = store.read_cleaned(columns=SUMMARY_COLUMNS, tickers=names)
+        changed.append(summary_rows(df, compute_ytd_returns(df, current_year)))
+
+    if not changed:
+        print("✓ Cleaned data is already up to date.")
+        return
+    tail = pd.concat(tails, ignore_index=True)
+    store.write_state(tail.sort_values(['Ticker', 'Date'], kind='mergesort', ignore_index=True))
+    changed = pd.concat(changed, ignore_index=True)
+    print(f"✓ Appended {appended} new rows for {len(changed)} tickers to {store.CLEANED_DIR}/")
+    merge_summary(changed, current_year)
+    store.write_manifest()
+
+def _new_bars(tickers, last, raw_dir):
+    """
+    The raw bars of `tickers` dated after each one's `last` cleaned date, and
+    every bar of a ticker that has none. Tickers that share a last date are
+    read together, each group from its own cutoff, so the date filter can
+    skip everything a ticker has already cleaned.
+    """
+    cutoffs = last.reindex(tickers)
+    known = cutoffs.dropna()
+    parts = [store.read_raw(start=cutoff + pd.Timedelta(1, 'ns'), tickers=list(group.index),
+                            root=raw_dir)
+             for cutoff, group in known.groupby(known)]
+    unseen = list(cutoffs.index[cutoffs.isna()])
+    if unseen:
+        parts.append(store.read_raw(tickers=unseen, root=raw_dir))
+    parts = [p for p in parts if not p.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def merge_summary(rows, current_year):
+    """
+    Replace the summary rows of the tickers in `rows` and keep every other
+    ticker's row as it is.
+
+    The YTD figures of the tickers left out are only valid for the year the
+    summary was written in, so if there is no summary yet or the year has
+    rolled over, the summary is rebuilt from the whole store instead.
+    """
+    old = store.read_summary() if os.path.exists(store.SUMMARY_PATH) else None
+    if old is None or pd.to_datetime(old['Latest_Date']).dt.year.max() != current_year:
+        return summarize_cleaned()
+    kept = old[~old['Ticker'].isin(rows['Ticker'])]
+    # Ticker order, as summarize_cleaned() builds it, so the file comes out
+    # the same as after a full rebuild.
+    write_summary(pd.concat([kept, rows], ignore_index=True)
+                  .sort_values('Ticker', ignore_index=True))
+
+def _max_rel_diff(expected, actual):
+    """Largest relative difference over the float columns, or None if missing values differ."""
+    worst = 0.0
+    for col in [c for c in expected.columns if pd.api.types.is_float_dtype(expected[c])]:
+        a = actual[col].to_numpy(dtype=np.float64)
+        b = expected[col].to_numpy(dtype=np.float64)
+        if not np.array_equal(np.isnan(a), np.isnan(b)):
+            print(f"✗ {col}: missing values differ")
+            return None
+        ok = ~np.isnan(b)
+        if ok.any():
+            worst = max(worst, float(np.max(np.abs(a[ok] - b[ok]) / np.maximum(np.abs(b[ok]), 1e-12))))
+    return worst
+
+def verify_cleaned_data(raw_dir=store.RAW_DIR, chunk_size=CHUNK_TICKERS):
+    """
+    Recompute everything from the raw store, chunk by chunk, and compare with
+    the cleaned store and the weekly and monthly rollups.
+    """
+    tickers = sorted(set(store.tickers(raw_dir)) | set(store.tickers(store.CLEANED_DIR)))
+    worst = 0.0
+    for chunk in _chunks(tickers, chunk_size):
+        expected = transform(store.read_raw(tickers=chunk, root=raw_dir))
+        pairs = [('cleaned', expected, store.read_cleaned(tickers=chunk))]
+        pairs += [(freq, build_rollup(expected, freq), store.read_rollup(freq, tickers=chunk))
+                  for freq in ROLLUPS]
+        for name, exp, act in pairs:
+            if len(exp) != len(act):
+                print(f"✗ Row count differs in {name} for {chunk[0]}..{chunk[-1]}: "
+                      f"store has {len(act)}, full recompute {len(exp)}")
+                return False
+            diff = _max_rel_diff(exp, act)
+            if diff is None:
+                return False
+            worst = max(worst, diff)
+    match = worst < 1e-9
+    print(f"{'✓' if match else '✗'} Cleaned store vs full recompute: max relative difference {worst:.2e}")
+    return match
 
 def create_summary_stats(df, ytd_returns):
+    write_summary(summary_rows(df, ytd_returns))
+
+def summary_rows(df, ytd_returns):
+    """
+    One summary row per ticker, taken from that ticker's own latest bar.
+
+    `df` must be sorted by Ticker, Date, so a single grouped pass yields each
+    ticker's last row and average volume. A ticker that has no bar on the
+    most recent date overall simply reports its own latest bar and date.
+    """
+    grouped = df.groupby('Ticker', observed=True, sort=False)
+    latest = grouped.tail(1).set_index('Ticker')
+    avg_volume = grouped['Volume'].mean()
     
-    latest_date = df['Date'].max()
-    latest_data = df[df['Date'] == latest_date]
-    
-    summary = []
-    for ticker in df['Ticker'].unique():
-        stock_data = df[df['Ticker'] == ticker]
-        latest_stock = latest_data[latest_data['Ticker'] == ticker].iloc[0]
-        
-        summary.append({
-            'Ticker': ticker,
-            'Company': latest_stock['Company'],
-            'Latest_Price': round(latest_stock['Close'], 2),
-            'YTD_Return_%': round(ytd_returns.get(ticker, 0), 2),
-            '1Y_Return_%': round(latest_stock['Cumulative_Return'], 2),
-            'Avg_Volume': int(stock_data['Volume'].mean()),
-            '30D_Volatility_%': round(latest_stock['Volatility_30D'], 2),
-            'Latest_Date': latest_date.strftime('%Y-%m-%d')
-        })
-    
-    summary_df = pd.DataFrame(summary)
+    summary_df = pd.DataFrame({
+        'Ticker': latest.index.astype(str),
+        'Company': latest['Company'].astype(str).to_numpy(),
+        'Latest_Price': latest['Close'].round(2).to_numpy(),
+        'YTD_Return_%': ytd_returns.reindex(latest.index).fillna(0).round(2).to_numpy(),
+        '1Y_Return_%': latest['Cumulative_Return'].round(2).to_numpy(),
+        'Avg_Volume': avg_volume.reindex(latest.index).astype('int64').to_numpy(),
+        '30D_Volatility_%': latest['Volatility_30D'].round(2).to_numpy(),
+        'Latest_Date': latest['Date'].dt.strftime('%Y-%m-%d').to_numpy(),
+    })
+    return summary_df
+
+def write_summary(summary_df):
     summary_df = summary_df.sort_values('1Y_Return_%', ascending=False)
-    summary_df.to_csv('data/summary_stats.csv', index=False)
+    store.write_summary(summary_df)
     
     print("\n=== Summary Statistics ===")
     print(summary_df.to_string(index=False))
-    print(f"\nSummary saved to data/summary_stats.csv")
+    print(f"\nSummary saved to {store.SUMMARY_PATH}")
+
+def memory_report():
+    """
+    Print the memory the dashboard's frame takes per 1,000 ticker-years, in
+    the old all-float64/object-string layout with stored calendar columns and
+    in store.FRAME_SCHEMA.
+    """
+    legacy = store.read_cleaned()
+    legacy = legacy.astype({'Ticker': object, 'Company': object})
+    for col in ['Year', 'Month', 'Quarter']:
+        legacy[col] = store.CALENDAR_COLUMNS[col](legacy['Date']).astype('int64')
+    legacy['Year_Month'] = legacy['Date'].dt.to_period('M').astype(str)
+    compact = store.read_cleaned(compact=True)
+
+    before, after = store.frame_memory(legacy), store.frame_memory(compact)
+    print(f"Memory per 1,000 ticker-years ({len(compact)} rows on disk):")
+    print(f"  before (float64, object strings, calendar columns): {before / 1e6:8.1f} MB")
+    print(f"  after  (FRAME_SCHEMA):                              {after / 1e6:8.1f} MB")
+    print(f"  {1 - after / before:.0%} smaller")
 
 if __name__ == "__main__":
-    df = clean_and_transform_data()
+    parser = argparse.ArgumentParser(description="Build data/cleaned/ and the summary stats from data/raw/.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only compute rows for bars newer than the cleaned store")
+    parser.add_argument('--verify', action='store_true',
+                        help="check the cleaned store against a full in-memory recompute")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="clean tickers in this many processes (default: 1, serial)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_TICKERS,
+                        help=f"tickers cleaned together (default: {CHUNK_TICKERS})")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="report the in-memory size of the cleaned frame per 1,000 ticker-years")
+    args = parser.parse_args()
+
+    if args.memory_report:
+        memory_report()
+    elif args.verify:
+        raise SystemExit(0 if verify_cleaned_data() else 1)
+    elif args.incremental:
+        update_cleaned_data()
+    else:
+        clean_and_transform_data(workers=args.workers, chunk_size=args.chunk_size)
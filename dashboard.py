@@ -1,9 +1,26 @@
 import streamlit as st
 import streamlit.components.v1 as components
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
 from datetime import timedelta
 
+import store
+from downsample import minmax_indices
+from live import (SESSION_OPEN, LiveBook, ReplaySource, SimulatedSource, live_summary,
+                  start_ingest)
+from rollups import ROLLUPS
+from timing import SpanMetrics, Spans, log, log_spans, process_rss, serve_metrics
+
 st.set_page_config(
     page_title="Stock Market Analysis Dashboard",
     layout="wide",
@@ -23,6 +40,9 @@ PANEL_HEIGHT_PX = 620
 
 if "active_filters" not in st.session_state:
     st.session_state.active_filters = set()
+# Identifies this session in the process-wide memory report.
+if "session_key" not in st.session_state:
+    st.session_state.session_key = uuid.uuid4().hex
 
 st.markdown(f"""
 <style>
@@ -142,19 +162,20 @@ st.markdown(f"""
     color: {TEXT_WHITE} !important;
 }}
 
-.stTabs [data-baseweb="tab-list"] {{
+.stRadio [role="radiogroup"] {{
     gap: 6px; background-color: {CARD_BG};
     padding: 0.4rem; border-radius: 8px;
     flex-wrap: nowrap !important; overflow-x: auto; scrollbar-width: none;
 }}
-.stTabs [data-baseweb="tab-list"]::-webkit-scrollbar {{ display: none; }}
-.stTabs [data-baseweb="tab"] {{
+.stRadio [role="radiogroup"]::-webkit-scrollbar {{ display: none; }}
+.stRadio [data-baseweb="radio"] {{
     background-color: transparent; color: {TEXT_GRAY};
-    border-radius: 6px; padding: 0.5rem 1.1rem;
+    border-radius: 6px; padding: 0.5rem 1.1rem; margin: 0;
     font-weight: 500; white-space: nowrap;
     flex-shrink: 0; font-size: clamp(0.78rem, 1vw, 0.9rem);
 }}
-.stTabs [aria-selected="true"] {{ background-color: {PRIMARY_GREEN}; color: {TEXT_WHITE}; }}
+.stRadio [data-baseweb="radio"] > div:first-child {{ display: none; }}
+.stRadio [data-baseweb="radio"]:has(input:checked) {{ background-color: {PRIMARY_GREEN}; color: {TEXT_WHITE}; }}
 
 h1, h2, h3 {{ color: {TEXT_WHITE} !important; min-width: 0; overflow: hidden; text-overflow: ellipsis; }}
 
@@ -192,12 +213,234 @@ hr {{ border-color: {PRIMARY_GREEN} !important; opacity: 0.3 !important; }}
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    df = pd.read_csv('data/stock_data_cleaned.csv')
-    df['Date'] = pd.to_datetime(df['Date'])
-    summary = pd.read_csv('data/summary_stats.csv')
-    return df, summary
+# Columns the charts and widgets in main() actually read.
+DASHBOARD_COLUMNS = (
+    'Date', 'Ticker', 'Company', 'Close', 'Volume',
+    'Cumulative_Return', 'MA_50', 'MA_200', 'Volatility_30D',
+)
+
+def build_company_index(df):
+    """
+    Map each company to its date-sorted rows of `df` and their dates as a
+    NumPy array, so a company and date range can be sliced by binary search.
+
+    The store returns rows grouped by ticker, so each company is normally a
+    contiguous run and its entry is an iloc view of `df`, not a copy.
+    """
+    index = {}
+    for company, rows in df.groupby('Company', observed=True, sort=False).indices.items():
+        if rows[-1] - rows[0] + 1 == len(rows):
+            part = df.iloc[rows[0]:rows[-1] + 1]
+        else:
+            part = df.iloc[rows]
+        if not part['Date'].is_monotonic_increasing:
+            part = part.sort_values('Date', kind='mergesort')
+        index[company] = (part, part['Date'].to_numpy())
+    return index
+
+def company_rows(index, company, start=None, end=None):
+    """Rows for `company` with start <= Date <= end, found with searchsorted."""
+    if company not in index:
+        return pd.DataFrame()
+    part, dates = index[company]
+    lo = 0 if start is None else dates.searchsorted(np.datetime64(start, 'ns'), 'left')
+    hi = len(dates) if end is None else dates.searchsorted(np.datetime64(end, 'ns'), 'right')
+    return part.iloc[lo:hi]
+
+BENCHMARK_TICKER = '^GSPC'
+
+# Preselected in the sidebar when they are in the data.
+DEFAULT_STOCKS = ['Apple', 'Microsoft', 'NVIDIA', 'S&P 500']
+
+Kpis = namedtuple('Kpis', ['best', 'best_return', 'tech_avg', 'benchmark',
+                           'most_volatile', 'volatility'])
+
+def build_kpis(summary):
+    """The KPI row's figures, computed once per data version."""
+    best = summary.loc[summary['1Y_Return_%'].idxmax()]
+    most_vol = summary.loc[summary['30D_Volatility_%'].idxmax()]
+    is_bench = summary['Ticker'] == BENCHMARK_TICKER
+    bench = summary.loc[is_bench, '1Y_Return_%']
+    return Kpis(
+        best['Company'], best['1Y_Return_%'],
+        summary.loc[~is_bench, '1Y_Return_%'].mean(),
+        bench.iloc[0] if not bench.empty else None,
+        most_vol['Company'], most_vol['30D_Volatility_%'],
+    )
+
+def build_watchlist_records(summary):
+    """Company -> the record build_watchlist_html() expects for its card."""
+    return {
+        company: {'name': company, 'price': float(price), 'ret_1y': float(ret_1y),
+                  'ytd': float(ytd), 'vol': float(vol)}
+        for company, price, ret_1y, ytd, vol in zip(
+            summary['Company'], summary['Latest_Price'], summary['1Y_Return_%'],
+            summary['YTD_Return_%'], summary['30D_Volatility_%'])
+    }
+
+# Display formatting of the summary table, applied once per data version.
+# (Streamlit's NumberColumn formats have no thousands separator.)
+TABLE_COLUMNS = {
+    'Company':          ('Company',      str),
+    'Latest_Price':     ('Price',        '${:,.2f}'.format),
+    'YTD_Return_%':     ('YTD %',        '{:+.2f}%'.format),
+    '1Y_Return_%':      ('1Y Return %',  '{:+.2f}%'.format),
+    '30D_Volatility_%': ('Volatility %', '{:.2f}%'.format),
+    'Avg_Volume':       ('Avg Volume',   '{:,.0f}'.format),
+    'Latest_Date':      ('Updated',      str),
+}
+
+def build_summary_table(summary):
+    """
+    The summary table for every company, formatted and sorted by 1Y return,
+    indexed by company so a rerun only selects the rows it shows.
+    """
+    ranked = summary.sort_values('1Y_Return_%', ascending=False)
+    table = pd.DataFrame({
+        label: [fmt(v) for v in ranked[col]] for col, (label, fmt) in TABLE_COLUMNS.items()
+    })
+    table.index = ranked['Company'].to_numpy()
+    return table
+
+Dataset = namedtuple('Dataset', ['df', 'summary', 'index', 'version',
+                                 'records', 'kpis', 'table', 'rollups',
+                                 'tickers', 'first_date', 'last_date', 'nbytes'])
+
+# By default the dashboard keeps the bars on disk and queries each chart's
+# companies, dates and columns from the store when its figure is built
+# (view_index()). DASHBOARD_DATA=memory loads the whole cleaned history and
+# the rollups into every process instead, trading memory for the query.
+IN_MEMORY = os.environ.get('DASHBOARD_DATA') == 'memory'
+
+# Columns each chart reads, on top of Date and Company.
+CHART_COLUMNS = {
+    'total_gains':   ('Cumulative_Return',),
+    'price_history': ('Close', 'MA_50', 'MA_200'),
+    'volume':        ('Volume',),
+    'volatility':    ('Volatility_30D',),
+}
+
+# Bounds on the loaded datasets kept per process, on top of the
+# version-based invalidation in sync_data_version().
+DATA_CACHE_ENTRIES = 8
+DATA_CACHE_TTL = "1h"
+
+# cache_resource rather than cache_data: the index holds views into `df`,
+# and every rerun should share the same objects instead of unpickling a
+# private copy. Callers must treat the returned frames as read-only.
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES, ttl=DATA_CACHE_TTL)
+def load_data(version, columns=None, start=None, end=None, in_memory=IN_MEMORY):
+    summary = store.read_summary()
+    first_date, last_date = store.date_bounds(store.CLEANED_DIR)
+    table = build_summary_table(summary)
+    frames = [summary, table]
+    df, index, rollups = None, None, None
+    if in_memory:
+        df = store.query_bars('D', columns=columns, start=start, end=end)
+        index = build_company_index(df)
+        rollups = {}
+        for freq in ROLLUPS:
+            bars = store.query_bars(freq, columns=columns, start=start, end=end)
+            rollups[freq] = build_company_index(bars)
+            frames.append(bars)
+        frames.append(df)
+    tickers = dict(zip(summary['Company'], summary['Ticker']))
+    nbytes = sum(int(f.memory_usage(deep=True).sum()) for f in frames)
+    return Dataset(df, summary, index, version,
+                   build_watchlist_records(summary), build_kpis(summary),
+                   table, rollups, tickers, first_date, last_date, nbytes)
+
+def view_index(data, chart, resolution, companies, start, end):
+    """
+    Company index of the bars one chart shows: a lookup into the loaded
+    history in memory mode, otherwise a query of just those companies'
+    partitions over [start, end] for the chart's columns.
+    """
+    if data.index is not None:
+        return data.index if resolution == 'D' else data.rollups[resolution]
+    tickers = [data.tickers[c] for c in companies if c in data.tickers]
+    columns = ('Date', 'Company') + CHART_COLUMNS[chart]
+    return build_company_index(store.query_bars(resolution, tickers, columns, start, end))
+
+@st.cache_resource
+def _loaded_version():
+    return {'version': None, 'lock': threading.Lock()}
+
+def sync_data_version():
+    """
+    Current data version from the manifest written by clean_data.py.
+
+    When it differs from the version this process last served, every cache
+    derived from the old data (datasets, indexes, figures) is dropped at
+    once, so a long-running server picks up a re-clean on the next rerun
+    without a restart and never mixes old and new data.
+    """
+    version = store.data_version()
+    seen = _loaded_version()
+    with seen['lock']:
+        if seen['version'] != version:
+            load_data.clear()
+            figure_cache.clear()
+            seen['version'] = version
+    return version
+
+# Approximate drawable width of a chart in the left column of the wide
+# layout. Long traces are thinned to two points (min and max) per pixel
+# column before they are sent to the browser.
+CHART_WIDTH_PX = 1100
+
+def chart_points(cdata, column, width_px=CHART_WIDTH_PX):
+    """Date and value arrays for one trace, downsampled to the chart's point budget."""
+    x = cdata['Date'].to_numpy()
+    y = cdata[column].to_numpy()
+    if len(y) <= 2 * width_px:
+        return x, y
+    idx = minmax_indices(x, y, 2 * width_px)
+    return x[idx], y[idx]
+
+# Finest first: key, label and trading days per bar.
+RESOLUTIONS = (('D', 'Daily', 1), ('W', 'Weekly', 5), ('M', 'Monthly', 21))
+
+# Narrowest volume bar worth drawing. Grouped bars share each date's slot.
+BAR_MIN_PX = 1
+
+def pick_resolution(chart, start, end, n_series=1, width_px=CHART_WIDTH_PX):
+    """
+    Finest resolution whose bar count over [start, end] fits the chart: the
+    downsampling budget of two points per pixel column for line charts, and
+    BAR_MIN_PX per bar for the grouped volume bars.
+    """
+    if start is None or end is None:
+        return 'D'
+    days = np.busday_count(start, end + timedelta(days=1))
+    if chart == 'volume':
+        budget = width_px // (BAR_MIN_PX * n_series)
+    else:
+        budget = 2 * width_px
+    for key, _, per_bar in RESOLUTIONS:
+        if days / per_bar <= budget:
+            return key
+    return RESOLUTIONS[-1][0]
+
+def resolution_range(resolution, start, end):
+    """Widen `end` to the end of its period so the last, partial bar is shown."""
+    if resolution == 'D' or end is None:
+        return start, end
+    return start, pd.Timestamp(end).to_period(ROLLUPS[resolution]).end_time.normalize()
+
+# Figures with more points than this draw their lines with WebGL
+# (go.Scattergl) instead of SVG, which slows down past a few thousand points.
+# Points are counted as drawn, after chart_points(), so the threshold sits
+# below that budget: a Price History figure (three traces of up to
+# 2 * CHART_WIDTH_PX points) crosses it.
+WEBGL_POINT_THRESHOLD = 5_000
+
+def use_webgl(series):
+    """True when the (x, y) arrays of a figure, as drawn, add up to more than the SVG threshold."""
+    return sum(len(y) for _, y in series) > WEBGL_POINT_THRESHOLD
+
+# Built figures kept per process; see FigureCache.
+FIGURE_CACHE_SIZE = 64
 
 def plotly_theme():
     return dict(
@@ -229,71 +472,14 @@ COLOR_PALETTE = [
 ]
 
 
-def build_watchlist_html(
-    stocks_data: list,
-    active_filters: set,
-) -> str:
-    """
-    Build a COMPLETE HTML document for the watchlist display panel.
-
-    RENDERING RULE (enforced here):
-      Cards are rendered for EVERY stock in stocks_data — never filtered by
-      active_filters. active_filters only controls the visual state (active/dimmed).
-      This guarantees: adding a stock to the left multiselect → card appears
-      immediately. Removing from multiselect → card disappears immediately.
-      No secondary state gate between the data and the rendering.
+# Above this many cards the watchlist iframe only keeps the cards in view
+# (plus a few either side) in the DOM; below it every card is pre-rendered.
+WATCHLIST_VIRTUALIZE_ABOVE = 60
+WATCHLIST_OVERSCAN = 6
+WATCHLIST_CACHE_SIZE = 32
 
-    VISUAL STATES:
-      No active filters  → all cards at full opacity
-      Filter active,  IN → .is-active: accent border + subtle background
-      Filter active, OUT → .is-dimmed: 38% opacity (still visible, still clickable)
-
-    CLICK INTERACTIVITY:
-      Cards do NOT handle clicks here. The click is handled by native
-      st.button() elements rendered below this iframe in the right_col.
-      The iframe is display-only. This design avoids all postMessage complexity.
-    """
-    has_filter = len(active_filters) > 0
-    cards_html = ""
-
-    for stock in stocks_data:
-        name   = stock['name']
-        price  = stock['price']
-        ret_1y = stock['ret_1y']
-        ytd    = stock['ytd']
-        vol    = stock['vol']
-
-        in_filter  = name in active_filters
-        state_cls  = ""
-        if has_filter:
-            state_cls = "is-active" if in_filter else "is-dimmed"
-
-        ret_cls  = "pos" if ret_1y > 0 else ("neg" if ret_1y < 0 else "neu")
-        ret_sign = "+" if ret_1y > 0 else ""
-        ytd_cls  = "pos" if ytd >= 0 else "neg"
-        ytd_sign = "+" if ytd >= 0 else ""
-
-        safe_name = name.replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
-
-        cards_html += f"""<div class="card {state_cls}" data-stock="{safe_name}">
-  <div class="card-top">
-    <span class="card-name" title="{safe_name}">{safe_name}</span>
-    <span class="card-price">${price:,.2f}</span>
-  </div>
-  <div class="card-bottom">
-    <span class="badge {ret_cls}">1Y {ret_sign}{ret_1y:.1f}%</span>
-    <span class="badge {ytd_cls}">YTD {ytd_sign}{ytd:.1f}%</span>
-    <span class="card-vol">\u03c3 {vol:.2f}%</span>
-  </div>
-</div>"""
-
-    count = len(stocks_data)
-    filter_text = ""
-    if has_filter:
-        n_active = sum(1 for s in stocks_data if s['name'] in active_filters)
-        filter_text = f"Filtering: {n_active} of {count}"
-
-    return f"""<!DOCTYPE html>
+# The document head never changes between reruns, so it is built once.
+_WATCHLIST_HEAD = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
@@ -356,9 +542,10 @@ body {{
   border: 1px solid rgba(61,127,111,0.25);
   border-radius: 4px; padding: 2px 6px;
   white-space: nowrap;
-  display: {"flex" if filter_text else "none"};
+  display: none;
   align-items: center; gap: 4px;
 }}
+.filter-status.on {{ display: flex; }}
 .filter-dot {{
   width: 5px; height: 5px; border-radius: 50%;
   background: var(--accent); flex-shrink: 0;
@@ -406,6 +593,8 @@ body {{
   scrollbar-color: var(--green) transparent;
 }}
 .list::-webkit-scrollbar {{ width: 4px; }}
+.list.virtual {{ position: relative; }}
+.card-window {{ position: absolute; top: 0; left: 0; right: 0; }}
 .list::-webkit-scrollbar-thumb {{ background: var(--green); border-radius: 2px; }}
 
 .no-results {{
@@ -473,7 +662,164 @@ body {{
 }}
 </style>
 </head>
-<body>
+"""
+
+# Search: toggle display on cards — no DOM removal (avoids parent reflow)
+_WATCHLIST_SEARCH_JS = """<script>
+function applySearch(query) {
+  var q = query.toLowerCase().trim();
+  var cards = document.querySelectorAll('#cardList .card');
+  var visible = 0;
+  for (var i = 0; i < cards.length; i++) {
+    var name = (cards[i].getAttribute('data-stock') || '').toLowerCase();
+    var show = !q || name.indexOf(q) !== -1;
+    cards[i].style.display = show ? '' : 'none';
+    if (show) visible++;
+  }
+  document.getElementById('stockCount').textContent =
+    visible + ' stock' + (visible !== 1 ? 's' : '');
+  document.getElementById('noResults').style.display =
+    visible === 0 ? 'block' : 'none';
+}
+</script>"""
+
+# Virtualized list: CARDS holds every card's markup, but only the rows in
+# view are put in the DOM. A spacer sized to all matching rows keeps the
+# scrollbar honest, and the row height is measured from the first card.
+_WATCHLIST_VIRTUAL_JS = """<script>
+var list = document.getElementById('cardList');
+var spacer = document.getElementById('cardSpacer');
+var win = document.getElementById('cardWindow');
+var shown = [], rowH = 0, first = -1, last = -1, pending = false;
+
+function renderWindow() {
+  pending = false;
+  var lo = Math.max(0, Math.floor(list.scrollTop / rowH) - OVERSCAN);
+  var hi = Math.min(shown.length,
+                    Math.ceil((list.scrollTop + list.clientHeight) / rowH) + OVERSCAN);
+  if (lo === first && hi === last) return;
+  first = lo; last = hi;
+  var html = [];
+  for (var i = lo; i < hi; i++) html.push(CARDS[shown[i]]);
+  win.style.transform = 'translateY(' + (lo * rowH) + 'px)';
+  win.innerHTML = html.join('');
+}
+
+function applySearch(query) {
+  var q = query.toLowerCase().trim();
+  shown = [];
+  for (var i = 0; i < NAMES.length; i++) {
+    if (!q || NAMES[i].indexOf(q) !== -1) shown.push(i);
+  }
+  spacer.style.height = (shown.length * rowH) + 'px';
+  list.scrollTop = 0; first = last = -1;
+  renderWindow();
+  document.getElementById('stockCount').textContent =
+    shown.length + ' stock' + (shown.length !== 1 ? 's' : '');
+  document.getElementById('noResults').style.display =
+    shown.length === 0 ? 'block' : 'none';
+}
+
+win.innerHTML = CARDS[0];
+var card = win.firstElementChild;
+rowH = card.getBoundingClientRect().height + parseFloat(getComputedStyle(card).marginBottom);
+list.addEventListener('scroll', function () {
+  if (!pending) { pending = true; requestAnimationFrame(renderWindow); }
+});
+applySearch('');
+</script>"""
+
+def _watchlist_card(name, price, ret_1y, ytd, vol, state_cls):
+    ret_cls  = "pos" if ret_1y > 0 else ("neg" if ret_1y < 0 else "neu")
+    ret_sign = "+" if ret_1y > 0 else ""
+    ytd_cls  = "pos" if ytd >= 0 else "neg"
+    ytd_sign = "+" if ytd >= 0 else ""
+
+    safe_name = name.replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+
+    return f"""<div class="card {state_cls}" data-stock="{safe_name}">
+  <div class="card-top">
+    <span class="card-name" title="{safe_name}">{safe_name}</span>
+    <span class="card-price">${price:,.2f}</span>
+  </div>
+  <div class="card-bottom">
+    <span class="badge {ret_cls}">1Y {ret_sign}{ret_1y:.1f}%</span>
+    <span class="badge {ytd_cls}">YTD {ytd_sign}{ytd:.1f}%</span>
+    <span class="card-vol">\u03c3 {vol:.2f}%</span>
+  </div>
+</div>"""
+
+def build_watchlist_html(
+    stocks_data: list,
+    active_filters: set,
+) -> str:
+    """
+    Build a COMPLETE HTML document for the watchlist display panel.
+
+    RENDERING RULE (enforced here):
+      Cards are rendered for EVERY stock in stocks_data — never filtered by
+      active_filters. active_filters only controls the visual state (active/dimmed).
+      This guarantees: adding a stock to the left multiselect → card appears
+      immediately. Removing from multiselect → card disappears immediately.
+      No secondary state gate between the data and the rendering.
+
+    VISUAL STATES:
+      No active filters  → all cards at full opacity
+      Filter active,  IN → .is-active: accent border + subtle background
+      Filter active, OUT → .is-dimmed: 38% opacity (still visible, still clickable)
+
+    CLICK INTERACTIVITY:
+      Cards do NOT handle clicks here. The click is handled by native
+      st.button() elements rendered below this iframe in the right_col.
+      The iframe is display-only. This design avoids all postMessage complexity.
+
+    PERFORMANCE:
+      Documents are memoized on (stocks_data, active_filters), so an
+      unchanged watchlist costs one cache lookup per rerun. Card markup is
+      joined once (linear in the number of cards) into a document whose
+      <head> is a prebuilt constant. Above WATCHLIST_VIRTUALIZE_ABOVE cards,
+      the iframe keeps only the cards in view in the DOM.
+    """
+    rows = tuple(
+        (s['name'], s['price'], s['ret_1y'], s['ytd'], s['vol']) for s in stocks_data
+    )
+    return _watchlist_document(rows, frozenset(active_filters))
+
+@functools.lru_cache(maxsize=WATCHLIST_CACHE_SIZE)
+def _watchlist_document(rows, active_filters):
+    has_filter = len(active_filters) > 0
+    cards = []
+    for name, price, ret_1y, ytd, vol in rows:
+        state_cls = ""
+        if has_filter:
+            state_cls = "is-active" if name in active_filters else "is-dimmed"
+        cards.append(_watchlist_card(name, price, ret_1y, ytd, vol, state_cls))
+
+    count = len(rows)
+    filter_text = ""
+    if has_filter:
+        n_active = sum(1 for r in rows if r[0] in active_filters)
+        filter_text = f"Filtering: {n_active} of {count}"
+
+    if count > WATCHLIST_VIRTUALIZE_ABOVE:
+        names = [r[0].lower() for r in rows]
+        data = (f"var CARDS = {json.dumps(cards)};\n"
+                f"var NAMES = {json.dumps(names)};\n"
+                f"var OVERSCAN = {WATCHLIST_OVERSCAN};").replace('</', '<\\/')
+        list_html = """<div class="list virtual" id="cardList">
+    <div id="cardSpacer"></div>
+    <div class="card-window" id="cardWindow"></div>
+    <div class="no-results" id="noResults">No stocks match your search</div>
+  </div>"""
+        script = f"<script>\n{data}\n</script>\n{_WATCHLIST_VIRTUAL_JS}"
+    else:
+        list_html = f"""<div class="list" id="cardList">
+    {''.join(cards)}
+    <div class="no-results" id="noResults">No stocks match your search</div>
+  </div>"""
+        script = _WATCHLIST_SEARCH_JS
+
+    return _WATCHLIST_HEAD + f"""<body>
 
 <div class="wrapper">
 
@@ -482,15 +828,14 @@ body {{
     <span class="hdr-title">Watchlist</span>
     <div class="hdr-right">
       <span class="badge-count" id="stockCount">{count} stock{'s' if count != 1 else ''}</span>
-      <div class="filter-status" id="filterStatus">
+      <div class="filter-status{' on' if filter_text else ''}" id="filterStatus">
         <div class="filter-dot"></div>
         <span>{filter_text}</span>
       </div>
     </div>
   </div>
 
-  <!-- SEARCH: inline filter — JS toggles display:none on cards -->
-  <!-- Does NOT use dropdown — no absolute positioning, no overflow conflict -->
+  <!-- SEARCH: inline filter over the cards below -->
   <div class="search-wrap">
     <i class="search-icon">&#x2315;</i>
     <input
@@ -506,44 +851,470 @@ body {{
 
   <!-- CARD LIST — THE SCROLL CONTAINER                                    -->
   <!-- flex:1 + overflow-y:auto + min-height:0 = Three Laws satisfied      -->
-  <!-- Cards are pre-rendered from Python — no JS protocol needed          -->
-  <div class="list" id="cardList">
-    {cards_html}
-    <div class="no-results" id="noResults">No stocks match your search</div>
-  </div>
+  {list_html}
 
 </div>
 
-<script>
-// Search: toggle display on cards — no DOM removal (avoids parent reflow)
-// data-stock is pre-lowercased at render time for O(1) comparison
-function applySearch(query) {{
-  var q = query.toLowerCase().trim();
-  var cards = document.querySelectorAll('#cardList .card');
-  var visible = 0;
-  for (var i = 0; i < cards.length; i++) {{
-    var name = (cards[i].getAttribute('data-stock') || '').toLowerCase();
-    var show = !q || name.indexOf(q) !== -1;
-    cards[i].style.display = show ? '' : 'none';
-    if (show) visible++;
-  }}
-  document.getElementById('stockCount').textContent =
-    visible + ' stock' + (visible !== 1 ? 's' : '');
-  document.getElementById('noResults').style.display =
-    visible === 0 ? 'block' : 'none';
-}}
-</script>
+{script}
 
 </body>
 </html>"""
 
 
+def build_total_gains_figure(index, companies, start, end):
+    # Always SVG: the stacked fill='tonexty' areas between companies
+    # are not reliable in WebGL, where traces with different x grids
+    # get mismatched fills. chart_points() already bounds the points
+    # per trace.
+    fig = go.Figure()
+    for idx, company in enumerate(companies):
+        cdata = company_rows(index, company, start, end)
+        clr = COLOR_PALETTE[idx % len(COLOR_PALETTE)]
+        r, g, b = int(clr[1:3], 16), int(clr[3:5], 16), int(clr[5:7], 16)
+        x, y = chart_points(cdata, 'Cumulative_Return')
+        fig.add_trace(go.Scatter(
+            x=x, y=y,
+            mode='lines', name=company,
+            line=dict(width=2, color=clr),
+            fill='tonexty' if idx > 0 else 'tozeroy',
+            fillcolor=f"rgba({r},{g},{b},0.1)",
+            hovertemplate='<b>%{fullData.name}</b><br>%{y:.2f}%<extra></extra>',
+        ))
+    fig.update_layout(
+        **plotly_theme(),
+        title=dict(text="<b>Total Gains</b>",
+                   font=dict(size=16, color=TEXT_WHITE), x=0.02),
+        xaxis_title="", yaxis_title="Return (%)",
+        height=480, showlegend=True,
+        legend=dict(orientation="h", yanchor="top", y=-0.18,
+                    xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
+                    font=dict(size=11)),
+    )
+    fig.add_hline(y=0, line_dash="dash",
+                  line_color="rgba(176,176,176,0.3)", line_width=1)
+    return fig
+
+def build_price_history_figure(index, company, start, end):
+    cdata = company_rows(index, company, start, end)
+    series = [chart_points(cdata, col) for col in ('MA_200', 'MA_50', 'Close')]
+    Line = go.Scattergl if use_webgl(series) else go.Scatter
+    fig2  = go.Figure()
+    x, y = series[0]
+    fig2.add_trace(Line(
+        x=x, y=y, mode='lines',
+        name='200-Day MA',
+        line=dict(color='rgba(239,83,80,0.6)', width=1.5, dash='dot'),
+        hovertemplate='200-MA: $%{y:,.2f}<extra></extra>',
+    ))
+    x, y = series[1]
+    fig2.add_trace(Line(
+        x=x, y=y, mode='lines',
+        name='50-Day MA',
+        line=dict(color='rgba(95,159,143,0.8)', width=1.5, dash='dash'),
+        hovertemplate='50-MA: $%{y:,.2f}<extra></extra>',
+    ))
+    x, y = series[2]
+    fig2.add_trace(Line(
+        x=x, y=y, mode='lines',
+        name='Price', line=dict(color=ACCENT_GREEN, width=2.5),
+        fill='tozeroy', fillcolor='rgba(61,127,111,0.08)',
+        hovertemplate='<b>$%{y:,.2f}</b><extra></extra>',
+    ))
+    fig2.update_layout(
+        **plotly_theme(),
+        title=dict(text=f"<b>{company}</b> — Price Action",
+                   font=dict(size=16, color=TEXT_WHITE), x=0.02),
+        xaxis_title="", yaxis_title="Price (USD)",
+        height=480, showlegend=True,
+        legend=dict(orientation="h", yanchor="top", y=-0.18,
+                    xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
+                    font=dict(size=11)),
+    )
+    return fig2
+
+def build_volume_figure(index, companies, start, end):
+    series = [
+        (cdata['Date'].to_numpy(), cdata['Volume'].to_numpy())
+        for cdata in (company_rows(index, c, start, end) for c in companies)
+    ]
+    # No WebGL path: pick_resolution() keeps the bars to about one per pixel
+    # column, far below what SVG bars handle.
+    fig3 = go.Figure()
+    for idx, (company, (x, y)) in enumerate(zip(companies, series)):
+        fig3.add_trace(go.Bar(
+            x=x, y=y, name=company,
+            marker=dict(color=COLOR_PALETTE[idx % len(COLOR_PALETTE)],
+                        opacity=0.85, line=dict(width=0)),
+            hovertemplate='<b>%{fullData.name}</b><br>%{y:,.0f}<extra></extra>',
+        ))
+    fig3.update_layout(
+        **plotly_theme(),
+        title=dict(text="<b>Trading Volume</b>",
+                   font=dict(size=16, color=TEXT_WHITE), x=0.02),
+        xaxis_title="", yaxis_title="Volume",
+        barmode='group', bargap=0.2, height=480, showlegend=True,
+        legend=dict(orientation="h", yanchor="top", y=-0.18,
+                    xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
+                    font=dict(size=11)),
+    )
+    return fig3
+
+def build_volatility_figure(index, companies, start, end):
+    series = [
+        chart_points(company_rows(index, c, start, end), 'Volatility_30D')
+        for c in companies
+    ]
+    # WebGL lines have no spline shape; at that density it is not
+    # visible anyway.
+    gl = use_webgl(series)
+    Line = go.Scattergl if gl else go.Scatter
+    fig4 = go.Figure()
+    for idx, (company, (x, y)) in enumerate(zip(companies, series)):
+        fig4.add_trace(Line(
+            x=x, y=y,
+            mode='lines', name=company,
+            line=dict(width=2,
+                      color=COLOR_PALETTE[idx % len(COLOR_PALETTE)],
+                      shape='linear' if gl else 'spline'),
+            hovertemplate='<b>%{fullData.name}</b><br>%{y:.2f}%<extra></extra>',
+        ))
+    fig4.update_layout(
+        **plotly_theme(),
+        title=dict(text="<b>30-Day Volatility</b>",
+                   font=dict(size=16, color=TEXT_WHITE), x=0.02),
+        xaxis_title="", yaxis_title="Volatility (%)",
+        height=480, showlegend=True,
+        legend=dict(orientation="h", yanchor="top", y=-0.18,
+                    xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
+                    font=dict(size=11)),
+    )
+    return fig4
+
+# Tab label -> FIGURE_BUILDERS key, in display order.
+CHART_TABS = {
+    "Total Gains":      'total_gains',
+    "Price History":    'price_history',
+    "Trading Activity": 'volume',
+    "Price Swings":     'volatility',
+}
+
+FIGURE_BUILDERS = {
+    'total_gains':   build_total_gains_figure,
+    'price_history': build_price_history_figure,
+    'volume':        build_volume_figure,
+    'volatility':    build_volatility_figure,
+}
+
+class FigureCache:
+    """
+    Process-wide LRU of built Plotly figures, shared by every session.
+
+    Keys are (chart, companies, start, end, data_version, resolution), so a
+    rerun that only changes one chart's inputs rebuilds that chart alone. The
+    figures are shared objects and must not be mutated after they are cached.
+    """
 
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._figs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chart, companies, start, end, version, resolution, bars):
+        """The cached figure, built from the company index `bars()` on a miss."""
+        key = (chart, tuple(companies), start, end, version, resolution)
+        with self._lock:
+            fig = self._figs.get(key)
+            if fig is not None:
+                self._figs.move_to_end(key)
+                self.hits += 1
+                return fig
+            self.misses += 1
+        index = bars()
+        if chart == 'price_history':
+            fig = FIGURE_BUILDERS[chart](index, companies[0], start, end)
+        else:
+            fig = FIGURE_BUILDERS[chart](index, companies, start, end)
+        with self._lock:
+            self._figs[key] = fig
+            while len(self._figs) > self.maxsize:
+                self._figs.popitem(last=False)
+        return fig
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._figs), 'maxsize': self.maxsize}
+
+@st.cache_resource
+def figure_cache():
+    return FigureCache(FIGURE_CACHE_SIZE)
+
+# Timing spans are collected for sessions opened with ?debug=1, and for every
+# rerun when DASHBOARD_TIMING=1, which also logs one JSON line per rerun.
+# DASHBOARD_METRICS_PORT serves the totals at :<port>/metrics for Prometheus.
+TIMING_ALWAYS = os.environ.get('DASHBOARD_TIMING') == '1'
+METRICS_PORT = os.environ.get('DASHBOARD_METRICS_PORT')
+
+@st.cache_resource
+def span_metrics():
+    if TIMING_ALWAYS:
+        log.setLevel(logging.INFO)
+        log.addHandler(logging.StreamHandler())
+    metrics = SpanMetrics()
+    if METRICS_PORT:
+        serve_metrics(metrics, int(METRICS_PORT))
+    return metrics
+
+
+# Sessions that have not rerun for this long drop out of the memory report.
+SESSION_IDLE_S = 1800
+
+@st.cache_resource
+def session_registry():
+    return {'sessions': {}, 'lock': threading.Lock()}
+
+def deep_size(obj, seen=None):
+    """Approximate bytes reachable from `obj`, following containers."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+def memory_report(data):
+    """
+    What this process holds once for every session (the loaded dataset)
+    against what each session holds on its own (its session state), after
+    recording this session's size in the process-wide registry.
+    """
+    own = deep_size({k: st.session_state[k] for k in st.session_state})
+    now = time.monotonic()
+    registry = session_registry()
+    with registry['lock']:
+        sessions = registry['sessions']
+        sessions[st.session_state.session_key] = (own, now)
+        for sid in [s for s, (_, seen) in sessions.items() if now - seen > SESSION_IDLE_S]:
+            del sessions[sid]
+        n_sessions = len(sessions)
+        session_total = sum(size for size, _ in sessions.values())
+    return {
+        'process_resident_bytes': process_rss(),
+        'shared_data_bytes': data.nbytes,
+        'sessions': n_sessions,
+        'session_state_bytes': session_total,
+        'this_session_bytes': own,
+    }
 
 
+def show_kpis(slots, kpis):
+    slots[0].metric("Best Performer This Year",
+                    kpis.best, f"{kpis.best_return:.2f}%")
+    slots[1].metric("Avg Tech Growth (1Y)", f"{kpis.tech_avg:.2f}%")
+    val = f"{kpis.benchmark:.2f}%" if kpis.benchmark is not None else "N/A"
+    slots[2].metric("S&P 500 Benchmark", val)
+    slots[3].metric("Highest Volatility (30D)",
+                    kpis.most_volatile, f"{kpis.volatility:.2f}%")
+
+def show_table(slot, disp):
+    slot.dataframe(
+        disp, use_container_width=True, hide_index=True,
+        column_config={
+            'Company':      st.column_config.TextColumn('Company',      width='medium'),
+            'Price':        st.column_config.TextColumn('Price',        width='small'),
+            'YTD %':        st.column_config.TextColumn('YTD %',        width='small'),
+            '1Y Return %':  st.column_config.TextColumn('1Y Return %',  width='small'),
+            'Volatility %': st.column_config.TextColumn('Volatility %', width='small'),
+            'Avg Volume':   st.column_config.TextColumn('Avg Volume',   width='medium'),
+            'Updated':      st.column_config.TextColumn('Updated',      width='small'),
+        },
+    )
+
+# Streaming mode. DASHBOARD_LIVE=simulate runs a random-walk quote source
+# from the last closes; DASHBOARD_LIVE=<ticks.csv|.parquet> replays recorded
+# trades (see live.py), DASHBOARD_LIVE_SPEED times faster than real time.
+# One ingestion thread per process feeds a LiveBook; each session then
+# keeps its script running after the page is drawn and redraws only the
+# KPIs, chart and table whose companies ticked. ?live=0 turns it off for
+# a session. DASHBOARD_LIVE_SECONDS ends a session's stream after that long,
+# so an idle tab does not hold a script thread forever (0: until the next
+# interaction).
+LIVE_SOURCE = os.environ.get('DASHBOARD_LIVE')
+LIVE_SPEED = float(os.environ.get('DASHBOARD_LIVE_SPEED', '1'))
+LIVE_SECONDS = float(os.environ.get('DASHBOARD_LIVE_SECONDS', '600'))
+# Longest a streaming session goes without an element call, which is where
+# Streamlit stops it for a rerun; shortest time between two pushes of the
+# KPIs and table to the same browser; and between two pushes of the chart,
+# which is re-sent as a whole figure.
+LIVE_POLL_S = 0.25
+LIVE_REFRESH_S = 0.5
+LIVE_CHART_REFRESH_S = 5.0
+
+@st.cache_resource
+def _live_feed():
+    return {'version': None, 'book': None, 'stop': None, 'lock': threading.Lock()}
+
+def live_source(summary):
+    if LIVE_SOURCE == 'simulate':
+        opens = (pd.Timestamp(summary['Latest_Date'].max()) + pd.offsets.BDay(1)
+                 + SESSION_OPEN)
+        return SimulatedSource(dict(zip(summary['Ticker'], summary['Latest_Price'])),
+                               speed=LIVE_SPEED, start=opens)
+    return ReplaySource.from_file(LIVE_SOURCE, speed=LIVE_SPEED)
+
+def live_book(data):
+    """
+    The process-wide LiveBook for this data version. A new data version
+    stops the old ingestion thread and starts over from the new closes.
+    """
+    feed = _live_feed()
+    with feed['lock']:
+        if feed['version'] != data.version:
+            if feed['stop'] is not None:
+                feed['stop'].set()
+            book = LiveBook()
+            feed.update(version=data.version, book=book,
+                        stop=start_ingest(live_source(data.summary), book))
+        return feed['book']
+
+def live_quotes(data, bars, companies):
+    """
+    {company: bar} for the companies in `companies` with a live bar, each
+    with the last stored close as 'Base'.
+    """
+    quotes = {}
+    for company in companies:
+        bar = bars.get(data.tickers.get(company))
+        if bar is not None:
+            quotes[company] = dict(bar, Base=data.records[company]['price'])
+    return quotes
+
+def live_figure(fig, chart, resolution, last_date, quotes):
+    """
+    A copy of the cached daily figure `fig` with each quoted company's live
+    bar appended as its newest point, when the figure reaches the last
+    stored date. Total Gains is extended by the move since the last close;
+    volatility, and weekly or monthly bars, are left as of the last close.
+    """
+    if not quotes or resolution != 'D' or chart == 'volatility':
+        return fig
+    last = np.datetime64(last_date, 'ns')
+    fig = go.Figure(fig)
+    for trace in fig.data:
+        if chart == 'price_history':
+            if trace.name != 'Price':
+                continue
+            bar = next(iter(quotes.values()))
+        else:
+            bar = quotes.get(trace.name)
+        if bar is None or len(trace.x) == 0 or np.datetime64(trace.x[-1], 'ns') < last:
+            continue
+        day = np.datetime64(bar['Date'], 'ns')
+        if day <= last:
+            continue
+        if chart == 'total_gains':
+            y = ((1 + float(trace.y[-1]) / 100) * bar['Close'] / bar['Base'] - 1) * 100
+        elif chart == 'volume':
+            y = bar['Volume']
+        else:
+            y = bar['Close']
+        trace.x = np.append(np.asarray(trace.x, dtype='datetime64[ns]'), day)
+        trace.y = np.append(np.asarray(trace.y, dtype=np.float64), y)
+    return fig
+
+def stream_quotes(book, seen, data, summary, view, slots):
+    """
+    Push live updates into this session's placeholders until the user
+    interacts (Streamlit stops the script at the next element call) or
+    LIVE_SECONDS pass. Each push redraws only what the changed tickers
+    touch, and the chart at most every LIVE_CHART_REFRESH_S. The status
+    line is rewritten every LIVE_POLL_S so a rerun request is noticed
+    within that time.
+
+    The watchlist is not re-sent: components.html() would reload its iframe
+    and lose the search text and scroll position. Its prices are those of
+    the last rerun.
+    """
+    ticker_of = data.tickers
+    shown = {ticker_of[c] for c in view['shown'] if c in ticker_of}
+    listed = {ticker_of[c] for c in view['display'] if c in ticker_of}
+    kpis = build_kpis(summary)
+    started = time.monotonic()
+    pushed_at = chart_at = 0.0
+    chart_stale = False
+    while not LIVE_SECONDS or time.monotonic() - started < LIVE_SECONDS:
+        cooldown = pushed_at + LIVE_REFRESH_S - time.monotonic()
+        if cooldown > 0:
+            time.sleep(min(cooldown, LIVE_POLL_S))
+            version, changed, oldest = seen, {}, None
+        else:
+            version, changed, oldest = book.wait(seen, LIVE_POLL_S)
+        stats = book.stats()
+        slots['status'].caption(f"● Live · {stats['ticks']:,} ticks · "
+                                f"{stats['ticks_per_s']:,.0f}/s")
+        now = time.monotonic()
+        if changed:
+            seen = version
+            summary = live_summary(summary, changed)
+            new_kpis = build_kpis(summary)
+            if new_kpis != kpis:
+                kpis = new_kpis
+                show_kpis(slots['kpis'], kpis)
+            if listed & changed.keys():
+                table = build_summary_table(summary)
+                rows = table.index.get_indexer(view['display'])
+                show_table(slots['table'], table.iloc[np.sort(rows[rows >= 0])]
+                           .reset_index(drop=True))
+            chart_stale = chart_stale or bool(shown & changed.keys())
+            book.record_update(time.perf_counter() - oldest)
+            pushed_at = now
+        elif book.done and not chart_stale:
+            break
+        if chart_stale and now - chart_at >= LIVE_CHART_REFRESH_S:
+            bars = book.snapshot()[1]
+            slots['chart'].plotly_chart(
+                live_figure(view['figure'], view['chart'], view['resolution'],
+                            data.last_date, live_quotes(data, bars, view['shown'])),
+                use_container_width=True)
+            chart_stale, chart_at = False, now
+        live = book.stats()
+        span_metrics().set_gauges(
+            live_ticks_total=live['ticks'],
+            live_update_latency_p50_seconds=live.get('update_p50_ms', 0) / 1e3,
+            live_update_latency_p95_seconds=live.get('update_p95_ms', 0) / 1e3,
+        )
+    else:
+        slots['status'].caption("○ Live paused · interact to resume")
 
 def main():
-    df, summary = load_data()
+    debug = st.query_params.get('debug') == '1'
+    spans = Spans(enabled=debug or TIMING_ALWAYS or bool(METRICS_PORT))
+
+    with spans.span('load_data'):
+        data = load_data(sync_data_version(), columns=DASHBOARD_COLUMNS)
+        version, kpis = data.version, data.kpis
+
+    # Live quotes known when the page is drawn; stream_quotes() takes over
+    # from this book version once it is.
+    book, seen, live_bars = None, 0, {}
+    summary, records = data.summary, data.records
+    if LIVE_SOURCE and st.query_params.get('live') != '0':
+        book = live_book(data)
+        seen, live_bars = book.snapshot()
+        if live_bars:
+            summary = live_summary(data.summary, live_bars)
+            records = build_watchlist_records(summary)
+            kpis = build_kpis(summary)
 
     st.sidebar.markdown(f"""
         <div style='text-align:center;padding:2rem 0.5rem 1.5rem;margin-bottom:1.5rem;
@@ -555,8 +1326,8 @@ def main():
         </div>
     """, unsafe_allow_html=True)
 
-    min_date = df['Date'].min()
-    max_date = df['Date'].max()
+    min_date = data.first_date
+    max_date = data.last_date
 
     st.sidebar.markdown(
         f"<p style='color:{LIGHT_GREEN};font-size:0.85rem;font-weight:600;"
@@ -572,7 +1343,7 @@ def main():
     st.sidebar.markdown("<div style='margin:1.5rem 0 0.25rem;'></div>",
                         unsafe_allow_html=True)
 
-    all_stocks = sorted(df['Company'].unique().tolist())
+    all_stocks = sorted(data.tickers)
 
     st.sidebar.markdown(
         f"<p style='color:{LIGHT_GREEN};font-size:0.85rem;font-weight:600;"
@@ -585,7 +1356,7 @@ def main():
     selected_stocks = st.sidebar.multiselect(
         "stocks",
         options=all_stocks,
-        default=['Apple', 'Microsoft', 'NVIDIA', 'S&P 500'],
+        default=[c for c in DEFAULT_STOCKS if c in data.tickers] or all_stocks[:4],
         label_visibility="collapsed",
         placeholder="Search stocks…",
     )
@@ -595,28 +1366,26 @@ def main():
         st.info("Use the sidebar to select stocks for analysis.")
         return
 
-    st.session_state.active_filters = {
-        f for f in st.session_state.active_filters
-        if f in selected_stocks           
-    }
-    active_filters = st.session_state.active_filters  
+    # Filled in at the end of the rerun, once every span has finished.
+    debug_panel = st.sidebar.empty() if debug else None
+    live_status = st.sidebar.empty() if book is not None else None
 
-    if active_filters:
-        display_stocks = [s for s in selected_stocks if s in active_filters]
-    else:
-        display_stocks = list(selected_stocks)
+    with spans.span('filter'):
+        st.session_state.active_filters = {
+            f for f in st.session_state.active_filters
+            if f in selected_stocks           
+        }
+        active_filters = st.session_state.active_filters  
 
-    if len(date_range) == 2:
-        mask = (
-            (df['Date'] >= pd.to_datetime(date_range[0])) &
-            (df['Date'] <= pd.to_datetime(date_range[1]))
-        )
-        filtered_df = df[mask]
-    else:
-        filtered_df = df
+        if active_filters:
+            display_stocks = [s for s in selected_stocks if s in active_filters]
+        else:
+            display_stocks = list(selected_stocks)
 
-    all_selected_df = filtered_df[filtered_df['Company'].isin(selected_stocks)]
-    display_df = filtered_df[filtered_df['Company'].isin(display_stocks)]
+        if len(date_range) == 2:
+            start, end = date_range
+        else:
+            start, end = None, None
 
     filter_badge = ""
     if active_filters:
@@ -632,26 +1401,8 @@ def main():
         unsafe_allow_html=True,
     )
 
-    k1, k2, k3, k4 = st.columns(4, gap="medium")
-
-    best = summary.nlargest(1, '1Y_Return_%').iloc[0]
-    with k1:
-        st.metric("Best Performer This Year",
-                  best['Company'], f"{best['1Y_Return_%']:.2f}%")
-
-    tech_avg = summary[summary['Ticker'] != '^GSPC']['1Y_Return_%'].mean()
-    with k2:
-        st.metric("Avg Tech Growth (1Y)", f"{tech_avg:.2f}%")
-
-    sp500 = summary[summary['Ticker'] == '^GSPC']
-    with k3:
-        val = f"{sp500.iloc[0]['1Y_Return_%']:.2f}%" if not sp500.empty else "N/A"
-        st.metric("S&P 500 Benchmark", val)
-
-    most_vol = summary.nlargest(1, '30D_Volatility_%').iloc[0]
-    with k4:
-        st.metric("Highest Volatility (30D)",
-                  most_vol['Company'], f"{most_vol['30D_Volatility_%']:.2f}%")
+    kpi_slots = [col.empty() for col in st.columns(4, gap="medium")]
+    show_kpis(kpi_slots, kpis)
 
     st.markdown("---")
 
@@ -672,140 +1423,69 @@ def main():
             section_label = "<h3 style='margin:0 0 0.5rem;font-size:1.05rem;'>Detailed Analysis</h3>"
         st.markdown(section_label, unsafe_allow_html=True)
 
-        tab1, tab2, tab3, tab4 = st.tabs(
-            ["Total Gains", "Price History", "Trading Activity", "Price Swings"]
+        # Only the selected tab's figure is built and sent: st.tabs would run
+        # and serialize all four on every rerun.
+        active_tab = st.radio(
+            "chart_tab", list(CHART_TABS), horizontal=True,
+            key="active_tab", label_visibility="collapsed",
         )
 
-        with tab1:
-            fig = go.Figure()
-            for idx, company in enumerate(display_stocks):
-                cdata = display_df[display_df['Company'] == company]
-                clr = COLOR_PALETTE[idx % len(COLOR_PALETTE)]
-                r, g, b = int(clr[1:3], 16), int(clr[3:5], 16), int(clr[5:7], 16)
-                fig.add_trace(go.Scatter(
-                    x=cdata['Date'], y=cdata['Cumulative_Return'],
-                    mode='lines', name=company,
-                    line=dict(width=2, color=clr),
-                    fill='tonexty' if idx > 0 else 'tozeroy',
-                    fillcolor=f"rgba({r},{g},{b},0.1)",
-                    hovertemplate='<b>%{fullData.name}</b><br>%{y:.2f}%<extra></extra>',
-                ))
-            fig.update_layout(
-                **plotly_theme(),
-                title=dict(text="<b>Total Gains</b>",
-                           font=dict(size=16, color=TEXT_WHITE), x=0.02),
-                xaxis_title="", yaxis_title="Return (%)",
-                height=480, showlegend=True,
-                legend=dict(orientation="h", yanchor="top", y=-0.18,
-                            xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
-                            font=dict(size=11)),
-            )
-            fig.add_hline(y=0, line_dash="dash",
-                          line_color="rgba(176,176,176,0.3)", line_width=1)
-            st.plotly_chart(fig, use_container_width=True)
+        figures = figure_cache()
+        companies = tuple(display_stocks)
 
-        with tab2:
+        # The selectbox has a fixed key, so a pick is not lost to a new
+        # widget on the rerun it triggers. It only exists while Price History
+        # is showing and Streamlit drops its state while it is hidden, so the
+        # choice is also kept in price_history_company and put back.
+        sel_co = st.session_state.get('price_history_company')
+        if sel_co not in display_stocks:
+            sel_co = display_stocks[0]
+
+        if active_tab == "Price History":
             st.markdown(
                 f"<p style='color:{TEXT_GRAY};font-size:0.88rem;margin-bottom:0.75rem;'>"
                 "Select a stock for detailed technical analysis</p>",
                 unsafe_allow_html=True,
             )
+            if st.session_state.get('company_select') not in display_stocks:
+                st.session_state.company_select = sel_co
             sel_co = st.selectbox(
-                "company_select", display_stocks, label_visibility="collapsed"
-            )
-            cdata = display_df[display_df['Company'] == sel_co]
-            fig2  = go.Figure()
-            fig2.add_trace(go.Scatter(
-                x=cdata['Date'], y=cdata['MA_200'], mode='lines',
-                name='200-Day MA',
-                line=dict(color='rgba(239,83,80,0.6)', width=1.5, dash='dot'),
-                hovertemplate='200-MA: $%{y:,.2f}<extra></extra>',
-            ))
-            fig2.add_trace(go.Scatter(
-                x=cdata['Date'], y=cdata['MA_50'], mode='lines',
-                name='50-Day MA',
-                line=dict(color='rgba(95,159,143,0.8)', width=1.5, dash='dash'),
-                hovertemplate='50-MA: $%{y:,.2f}<extra></extra>',
-            ))
-            fig2.add_trace(go.Scatter(
-                x=cdata['Date'], y=cdata['Close'], mode='lines',
-                name='Price', line=dict(color=ACCENT_GREEN, width=2.5),
-                fill='tozeroy', fillcolor='rgba(61,127,111,0.08)',
-                hovertemplate='<b>$%{y:,.2f}</b><extra></extra>',
-            ))
-            fig2.update_layout(
-                **plotly_theme(),
-                title=dict(text=f"<b>{sel_co}</b> — Price Action",
-                           font=dict(size=16, color=TEXT_WHITE), x=0.02),
-                xaxis_title="", yaxis_title="Price (USD)",
-                height=480, showlegend=True,
-                legend=dict(orientation="h", yanchor="top", y=-0.18,
-                            xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
-                            font=dict(size=11)),
-            )
-            st.plotly_chart(fig2, use_container_width=True)
-
-        with tab3:
-            fig3 = go.Figure()
-            for idx, company in enumerate(display_stocks):
-                cdata = display_df[display_df['Company'] == company]
-                fig3.add_trace(go.Bar(
-                    x=cdata['Date'], y=cdata['Volume'], name=company,
-                    marker=dict(color=COLOR_PALETTE[idx % len(COLOR_PALETTE)],
-                                opacity=0.85, line=dict(width=0)),
-                    hovertemplate='<b>%{fullData.name}</b><br>%{y:,.0f}<extra></extra>',
-                ))
-            fig3.update_layout(
-                **plotly_theme(),
-                title=dict(text="<b>Trading Volume</b>",
-                           font=dict(size=16, color=TEXT_WHITE), x=0.02),
-                xaxis_title="", yaxis_title="Volume",
-                barmode='group', bargap=0.2, height=480, showlegend=True,
-                legend=dict(orientation="h", yanchor="top", y=-0.18,
-                            xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
-                            font=dict(size=11)),
-            )
-            st.plotly_chart(fig3, use_container_width=True)
-
-        with tab4:
-            fig4 = go.Figure()
-            for idx, company in enumerate(display_stocks):
-                cdata = display_df[display_df['Company'] == company]
-                fig4.add_trace(go.Scatter(
-                    x=cdata['Date'], y=cdata['Volatility_30D'],
-                    mode='lines', name=company,
-                    line=dict(width=2,
-                              color=COLOR_PALETTE[idx % len(COLOR_PALETTE)],
-                              shape='spline'),
-                    hovertemplate='<b>%{fullData.name}</b><br>%{y:.2f}%<extra></extra>',
-                ))
-            fig4.update_layout(
-                **plotly_theme(),
-                title=dict(text="<b>30-Day Volatility</b>",
-                           font=dict(size=16, color=TEXT_WHITE), x=0.02),
-                xaxis_title="", yaxis_title="Volatility (%)",
-                height=480, showlegend=True,
-                legend=dict(orientation="h", yanchor="top", y=-0.18,
-                            xanchor="left", x=0, bgcolor='rgba(0,0,0,0)',
-                            font=dict(size=11)),
+                "company_select", display_stocks, key='company_select',
+                label_visibility="collapsed",
             )
-            st.plotly_chart(fig4, use_container_width=True)
+            st.session_state.price_history_company = sel_co
+
+        def tab_figure(tab):
+            chart = CHART_TABS[tab]
+            shown = (sel_co,) if chart == 'price_history' else companies
+            res = pick_resolution(chart, start, end, len(shown))
+            lo, hi = resolution_range(res, start, end)
+            built = []
+
+            def bars():
+                built.append(chart)
+                return view_index(data, chart, res, shown, lo, hi)
+            with spans.span(f'figure:{chart}'):
+                fig = figures.get(chart, shown, lo, hi, version, res, bars)
+            return fig, res, bool(built)
+
+        fig, res, active_built = tab_figure(active_tab)
+        chart_slot = st.empty()
+        shown_companies = (sel_co,) if CHART_TABS[active_tab] == 'price_history' else companies
+        live_fig = live_figure(fig, CHART_TABS[active_tab], res, data.last_date,
+                               live_quotes(data, live_bars, shown_companies))
+        with spans.span(f'render:{CHART_TABS[active_tab]}'):
+            chart_slot.plotly_chart(live_fig, use_container_width=True)
+        if res != 'D':
+            label = dict((k, l) for k, l, _ in RESOLUTIONS)[res]
+            st.caption(f"{label} bars: the selected range has too many trading days "
+                       "to draw daily bars at this width.")
 
     with right_col:
-        stocks_data = []
-        for company in selected_stocks:
-            row = summary[summary['Company'] == company]
-            if not row.empty:
-                r = row.iloc[0]
-                stocks_data.append({
-                    'name':   company,
-                    'price':  float(r['Latest_Price']),
-                    'ret_1y': float(r['1Y_Return_%']),
-                    'ytd':    float(r['YTD_Return_%']),
-                    'vol':    float(r['30D_Volatility_%']),
-                })
-
-        watchlist_html = build_watchlist_html(stocks_data, active_filters)
+        with spans.span('watchlist_html'):
+            stocks_data = [records[c] for c in selected_stocks if c in records]
+
+            watchlist_html = build_watchlist_html(stocks_data, active_filters)
         components.html(watchlist_html, height=PANEL_HEIGHT_PX, scrolling=False)
 
     st.markdown("---")
@@ -820,46 +1500,60 @@ def main():
         unsafe_allow_html=True,
     )
 
-    disp = (
-        summary[summary['Company'].isin(display_stocks)]
-        .copy()
-        .sort_values('1Y_Return_%', ascending=False)
-        .rename(columns={
-            'Latest_Price':     'Price',
-            'YTD_Return_%':     'YTD %',
-            '1Y_Return_%':      '1Y Return %',
-            '30D_Volatility_%': 'Volatility %',
-            'Avg_Volume':       'Avg Volume',
-            'Latest_Date':      'Updated',
-        })
-        .drop(columns=['Ticker'])
-        [['Company', 'Price', 'YTD %', '1Y Return %', 'Volatility %', 'Avg Volume', 'Updated']]
-    )
-    disp['Price']        = disp['Price'].apply(lambda x: f'${x:,.2f}')
-    disp['YTD %']        = disp['YTD %'].apply(lambda x: f'{x:+.2f}%')
-    disp['1Y Return %']  = disp['1Y Return %'].apply(lambda x: f'{x:+.2f}%')
-    disp['Volatility %'] = disp['Volatility %'].apply(lambda x: f'{x:.2f}%')
-    disp['Avg Volume']   = disp['Avg Volume'].apply(lambda x: f'{x:,.0f}')
+    with spans.span('summary_table'):
+        table = data.table if not live_bars else build_summary_table(summary)
+        rows = table.index.get_indexer(display_stocks)
+        disp = table.iloc[np.sort(rows[rows >= 0])].reset_index(drop=True)
 
-    st.dataframe(
-        disp, use_container_width=True, hide_index=True,
-        column_config={
-            'Company':      st.column_config.TextColumn('Company',      width='medium'),
-            'Price':        st.column_config.TextColumn('Price',        width='small'),
-            'YTD %':        st.column_config.TextColumn('YTD %',        width='small'),
-            '1Y Return %':  st.column_config.TextColumn('1Y Return %',  width='small'),
-            'Volatility %': st.column_config.TextColumn('Volatility %', width='small'),
-            'Avg Volume':   st.column_config.TextColumn('Avg Volume',   width='medium'),
-            'Updated':      st.column_config.TextColumn('Updated',      width='small'),
-        },
-    )
+    table_slot = st.empty()
+    show_table(table_slot, disp)
 
     st.markdown(f"""
     <div class="footer">
         Data Source: Yahoo Finance &nbsp;|&nbsp;
-        Last Updated: {df['Date'].max().strftime('%Y-%m-%d')}
+        Last Updated: {max_date.strftime('%Y-%m-%d')}
     </div>
     """, unsafe_allow_html=True)
 
+    # Warm the figure cache for the next tab so switching to it is a cache
+    # hit. This still runs on the script thread and the rerun only finishes
+    # after it, so it is skipped when the visible chart itself had to be
+    # built: a selection change then costs one figure build, not two.
+    if not active_built:
+        tabs = list(CHART_TABS)
+        with spans.span('prefetch'):
+            tab_figure(tabs[(tabs.index(active_tab) + 1) % len(tabs)])
+
+    if spans.enabled:
+        memory = memory_report(data)
+        span_metrics().set_gauges(**{k: v for k, v in memory.items()
+                                     if k != 'this_session_bytes'})
+        span_metrics().record(spans)
+        if TIMING_ALWAYS:
+            log_spans(spans, tab=CHART_TABS[active_tab], stocks=len(display_stocks),
+                      version=version)
+    if debug:
+        with debug_panel.container():
+            with st.expander("Debug: timings", expanded=True):
+                st.dataframe(pd.DataFrame(spans.as_rows(), columns=['Span', 'ms']),
+                             hide_index=True, use_container_width=True,
+                             column_config={'ms': st.column_config.NumberColumn(format='%.2f')})
+                st.caption("Figure cache")
+                st.json(figures.stats())
+                st.caption("Memory (bytes)")
+                st.json(memory)
+                if book is not None:
+                    st.caption("Live quotes")
+                    st.json(book.stats())
+
+    if book is not None:
+        stream_quotes(book, seen, data, summary, {
+            'display': display_stocks, 'shown': shown_companies,
+            'chart': CHART_TABS[active_tab], 'resolution': res, 'figure': fig,
+        }, {
+            'status': live_status, 'kpis': kpi_slots, 'chart': chart_slot,
+            'table': table_slot,
+        })
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def minmax_indices(x, y, n_out):
+    """
+    Indices of at most ~n_out points keeping the min and max of every bucket.
+
+    The x range is split into n_out // 2 equal-width buckets (one per pixel
+    column when n_out is twice the plot width), and each bucket contributes
+    its lowest and highest y. Every peak and trough visible at that
+    resolution therefore survives. The first and last points are always kept.
+    NaN values are never chosen as extremes.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+    xf = _as_float(x)
+    yf = np.asarray(y, dtype=np.float64)
+    n_buckets = (n_out - 2) // 2
+    span = xf[-1] - xf[0]
+    if span <= 0:
+        return np.arange(n)
+    bucket = np.minimum(((xf - xf[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    valid = np.flatnonzero(~np.isnan(yf))
+    order = valid[np.lexsort((yf[valid], bucket[valid]))]
+    b = bucket[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = b[1:] != b[:-1]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = b[1:] != b[:-1]
+
+    keep = np.concatenate(([0, n - 1], order[first], order[last]))
+    return np.unique(keep)
+
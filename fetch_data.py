@@ -1,72 +1,285 @@
+import argparse
 import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
 import os
+import threading
+import time
 
-def fetch_stock_data():
-    tickers = {
-        'AAPL': 'Apple',
-        'MSFT': 'Microsoft',
-        'GOOGL': 'Google',
-        'AMZN': 'Amazon',
-        'NVDA': 'NVIDIA',
-        'META': 'Meta',
-        'TSLA': 'Tesla',
-        '^GSPC': 'S&P 500'
-    }
+import store
 
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=730)
+HISTORY_DAYS = 730
 
-    print(f"Fetching data from {start_date.date()} to {end_date.date()}.")
+# A day's bar is only final once the US session has closed. The margin past
+# the 16:00 close leaves time for the closing print to reach the provider.
+MARKET_TZ = 'America/New_York'
+MARKET_CLOSE = timedelta(hours=16, minutes=30)
 
-    os.makedirs('data', exist_ok=True)
-    all_data = []
+TICKERS = {
+    'AAPL': 'Apple',
+    'MSFT': 'Microsoft',
+    'GOOGL': 'Google',
+    'AMZN': 'Amazon',
+    'NVDA': 'NVIDIA',
+    'META': 'Meta',
+    'TSLA': 'Tesla',
+    '^GSPC': 'S&P 500'
+}
 
-    for ticker_sym, name in tickers.items():
-        print(f"Downloading {name} ({ticker_sym}).")
-        try:
-            ticker_obj = yf.Ticker(ticker_sym)
-            data = ticker_obj.history(start=start_date, end=end_date)
 
-            if data.empty:
-                print(f" No data returned for {ticker_sym}")
-                continue
+class YahooSource:
+    """Daily bars from Yahoo Finance via yfinance."""
+
+    def history(self, ticker_sym, start_date, end_date, timeout):
+        ticker_obj = yf.Ticker(ticker_sym)
+        data = ticker_obj.history(start=start_date, end=end_date,
+                                  timeout=timeout, raise_errors=True)
+
+        if data.empty:
+            return data
+
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+
+        data = data.reset_index()
+
+        data['Date'] = pd.to_datetime(data['Date']).dt.tz_localize(None)
+        return data
+
+
+class FrameSource:
+    """
+    Serves bars from an in-memory frame in the raw schema, with no network.
+
+    Useful as a fake provider in tests and for offline runs against data
+    that is already on disk (e.g. FrameSource(store.read_raw())).
+    """
+
+    def __init__(self, df):
+        self._by_ticker = {
+            str(t): part.drop(columns=['Ticker', 'Company'])
+            for t, part in df.groupby('Ticker', observed=True)
+        }
+
+    def history(self, ticker_sym, start_date, end_date, timeout):
+        data = self._by_ticker.get(ticker_sym)
+        if data is None:
+            return pd.DataFrame()
+        dates = data['Date']
+        return data[(dates >= pd.Timestamp(start_date)) & (dates < pd.Timestamp(end_date))]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def download_ticker(source, ticker_sym, name, start_date, end_date, timeout=30):
+    data = source.history(ticker_sym, start_date, end_date, timeout)
+
+    if data.empty:
+        return data
 
-            if isinstance(data.columns, pd.MultiIndex):
-                data.columns = data.columns.get_level_values(0)
+    data = data.copy()
+    data['Ticker'] = ticker_sym
+    data['Company'] = name
 
-            data = data.reset_index()
+    keep_cols = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Ticker', 'Company']
+    return data[[c for c in keep_cols if c in data.columns]]
 
-            data['Date'] = pd.to_datetime(data['Date']).dt.tz_localize(None)
 
-            data['Ticker'] = ticker_sym
-            data['Company'] = name
+def iter_downloads(source, jobs, workers=4, rate=2.0, burst=4, retries=3,
+                   backoff=1.0, timeout=30):
+    """
+    Download every (ticker_sym, name, start_date, end_date) job concurrently,
+    yielding (ticker_sym, frame) pairs in completion order.
 
-            keep_cols = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Ticker', 'Company']
-            data = data[[c for c in keep_cols if c in data.columns]]
+    At most `workers` requests are in flight and a shared token bucket caps
+    the request rate at `rate` per second. A failing ticker is retried up to
+    `retries` times with exponential backoff; `timeout` is handed to the
+    source for each request. Tickers that still fail after the last retry
+    are reported and skipped. Only `workers` jobs are submitted at a time,
+    and the next one once the caller has taken a finished frame, so the
+    frames downloaded but not yet written out, plus the one the caller is
+    writing, never number more than `workers`.
+    """
+    bucket = TokenBucket(rate, burst)
 
-            all_data.append(data)
-            print(f"{len(data)} rows downloaded")
+    def run(ticker_sym, name, start_date, end_date):
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                return download_ticker(source, ticker_sym, name, start_date, end_date, timeout)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2 ** attempt
+                print(f" {ticker_sym} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
 
-        except Exception as e:
-            print(f"Error fetching {ticker_sym}: {e}")
+    jobs = iter(jobs)
+    pending = {}
 
-    if not all_data:
-        print("\n No data was fetched. Try:")
-        print("   pip install --upgrade yfinance")
-        return pd.DataFrame()
+    def submit():
+        job = next(jobs, None)
+        if job is not None:
+            pending[pool.submit(run, *job)] = job[0]
 
-    df = pd.concat(all_data, ignore_index=True)
-    df.to_csv('data/stock_data_raw.csv', index=False)
-    print(f"\n Total records: {len(df)}")
-    print(f"   Date range: {df['Date'].min().date()} to {df['Date'].max().date()}")
-    print(f"   Stocks: {df['Company'].unique().tolist()}")
-    return df
+    # Jobs are submitted `workers` at a time, and the next one only once a
+    # finished frame has been handed over, so downloads never run ahead of
+    # a caller that is slower to write than they are to arrive.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(workers):
+            submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            del done
+            ticker_sym = pending.pop(future)
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"Error fetching {ticker_sym}: {e}")
+            else:
+                del future
+                yield ticker_sym, data
+                del data
+            submit()
+
+
+def completed_sessions_end(now=None):
+    """
+    Exclusive end date of the fetch window that covers completed sessions
+    only: tomorrow once today's session in New York has closed, otherwise
+    today, so a bar still being traded is never fetched.
+    """
+    now = pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now)
+    local = now.tz_convert(MARKET_TZ).tz_localize(None) if now.tzinfo is not None else now
+    today = local.normalize()
+    if local - today >= MARKET_CLOSE:
+        today += timedelta(days=1)
+    return today.to_pydatetime()
+
+
+def fetch_stock_data(incremental=False, tickers=None, source=None, workers=4,
+                     rate=2.0, retries=3, timeout=30, end_date=None):
+    """
+    Download daily OHLCV bars for every ticker into the raw store.
+
+    With incremental=True only the tail after each ticker's last stored date
+    is requested. The fetch starts on that last date so the overlap can be
+    dropped explicitly, and the new rows are appended to the raw store as a
+    new part file. Tickers with no stored rows get the full history.
+
+    Downloads run through iter_downloads(); pass a FrameSource (or any object
+    with a matching history() method) as `source` to run without network.
+    Each ticker is written to the store as soon as it arrives, so memory
+    holds a few tickers at a time rather than the whole universe. A full
+    fetch replaces each downloaded ticker's partition and, once at least one
+    ticker succeeded, drops partitions of tickers that are no longer listed
+    or failed. Returns {ticker_sym: rows written}.
+
+    A stored bar is never replaced, so a partial one fetched during market
+    hours could never be corrected. The window therefore ends at
+    `end_date` (exclusive), by default completed_sessions_end(): today's bar
+    is only fetched after the close.
+    """
+    tickers = TICKERS if tickers is None else tickers
+    source = YahooSource() if source is None else source
+
+    end_date = completed_sessions_end() if end_date is None else end_date
+    start_date = end_date - timedelta(days=HISTORY_DAYS)
+    last_stored = pd.Series(dtype='datetime64[ns]')
+    if incremental:
+        last_stored = store.last_dates(store.RAW_DIR)
+
+    mode = "Incremental fetch" if incremental else "Fetching data"
+    print(f"{mode} for {len(tickers)} tickers up to {(end_date - timedelta(days=1)).date()} "
+          f"({workers} workers, {rate:g} req/s).")
+
+    os.makedirs('data', exist_ok=True)
+    jobs = []
+    for ticker_sym, name in tickers.items():
+        last = last_stored.get(ticker_sym)
+        ticker_start = start_date if last is None else last.to_pydatetime()
+        jobs.append((ticker_sym, name, ticker_start, end_date))
+
+    written = {}
+    first_date = last_date = None
+    for ticker_sym, data in iter_downloads(source, jobs, workers=workers, rate=rate,
+                                           retries=retries, timeout=timeout):
+        if data.empty:
+            print(f" No data returned for {ticker_sym}")
+            continue
+
+        last = last_stored.get(ticker_sym)
+        if last is not None:
+            data = data[data['Date'] > last]
+        data = data.drop_duplicates(subset='Date', keep='last')
+
+        if data.empty:
+            print(f" {ticker_sym} is already up to date")
+            continue
+
+        if incremental:
+            store.append_raw(data)
+        else:
+            store.write_raw(data, replace=False)
+        written[ticker_sym] = len(data)
+        lo, hi = data['Date'].min(), data['Date'].max()
+        first_date = lo if first_date is None else min(first_date, lo)
+        last_date = hi if last_date is None else max(last_date, hi)
+        print(f"{tickers[ticker_sym]} ({ticker_sym}): {len(data)} rows downloaded")
+
+    if not written:
+        if incremental:
+            print("\n Raw store is already up to date.")
+        else:
+            print("\n No data was fetched. Try:")
+            print("   pip install --upgrade yfinance")
+        return written
+
+    if not incremental:
+        for stale in set(store.tickers(store.RAW_DIR)) - set(written):
+            store.remove_partition(store.RAW_DIR, stale)
+    print(f"\n Total records: {sum(written.values())}")
+    print(f"   Date range: {first_date.date()} to {last_date.date()}")
+    print(f"   Stocks: {[tickers[t] for t in tickers if t in written]}")
+    return written
 
 
 if __name__ == "__main__":
-    df = fetch_stock_data()
-    if not df.empty:
-        print("\nSample data:")
-        print(df.head())
+    parser = argparse.ArgumentParser(description="Download daily stock bars into data/raw/.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only fetch trading days after the last stored date per ticker")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="maximum number of concurrent downloads (default: 4)")
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help="maximum requests per second across all workers (default: 2)")
+    parser.add_argument('--retries', type=int, default=3,
+                        help="retries per ticker, with exponential backoff (default: 3)")
+    parser.add_argument('--timeout', type=float, default=30,
+                        help="per-request timeout in seconds (default: 30)")
+    args = parser.parse_args()
+
+    fetch_stock_data(incremental=args.incremental, workers=args.workers,
+                     rate=args.rate, retries=args.retries, timeout=args.timeout)
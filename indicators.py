@@ -0,0 +1,254 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One entry per derived column. `kind` names a kernel in KINDS, `source` is
+# the input column (which may itself be an earlier indicator), and `window`
+# is the trailing number of rows for rolling kernels. Adding an indicator is
+# a matter of adding a line here.
+Indicator = namedtuple('Indicator', ['name', 'kind', 'source', 'window', 'scale'],
+                       defaults=[None, 1.0])
+
+INDICATORS = (
+    Indicator('Daily_Return',      'pct_change',   'Close',        scale=100.0),
+    Indicator('Cumulative_Return', 'since_first',  'Close',        scale=100.0),
+    Indicator('MA_50',             'rolling_mean', 'Close',        window=50),
+    Indicator('MA_200',            'rolling_mean', 'Close',        window=200),
+    Indicator('Volatility_30D',    'rolling_std',  'Daily_Return', window=30),
+)
+
+
+class _Segments:
+    """Row layout of a frame sorted by Ticker, Date: each ticker is one contiguous run."""
+
+    def __init__(self, tickers, anchors=None):
+        codes = pd.factorize(tickers)[0]
+        n = len(codes)
+        is_start = np.ones(n, dtype=bool)
+        is_start[1:] = codes[1:] != codes[:-1]
+        self.n = n
+        self.starts = np.flatnonzero(is_start)
+        self.lengths = np.diff(np.append(self.starts, n))
+        self.first = np.repeat(self.starts, self.lengths)
+        self.pos = np.arange(n)
+        # Per-row first value of a source, for runs that don't start at the
+        # ticker's first bar (see IndicatorState).
+        self.anchors = anchors or {}
+
+    def first_value(self, source, x):
+        if source in self.anchors:
+            return self.anchors[source]
+        return x[self.first]
+
+
+class _Prefix:
+    """
+    Running sums of one source column, shared by every rolling mean over it.
+
+    Values are shifted by their ticker's mean before summing so the running
+    sums stay small and differences of them keep full precision. Each ticker's
+    sums start from zero, so its results do not depend on which other tickers
+    are in the frame (see clean_data's parallel mode).
+    """
+
+    def __init__(self, x, seg):
+        valid = ~np.isnan(x)
+        counts = np.add.reduceat(valid, seg.starts) if seg.n else np.zeros(0)
+        sums = np.add.reduceat(np.where(valid, x, 0.0), seg.starts) if seg.n else np.zeros(0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            shift = np.nan_to_num(sums / counts)
+        self.shift = np.repeat(shift, seg.lengths)
+        shifted = np.where(valid, x - self.shift, 0.0)
+        # Row r of ticker k sits at r + k + 1 in the padded arrays.
+        self.offset = np.repeat(np.arange(len(seg.starts)), seg.lengths)
+        # Per ticker: a leading zero, then the running sums of its rows. The
+        # tickers are laid out as the rows of a grid and summed with one
+        # cumsum along them, so every ticker's sums start from an exact zero.
+        # Subtracting each ticker's offset from a cumsum over the whole frame
+        # would leave its rounding depending on the tickers before it. Tickers
+        # share a grid with those of about the same length (lengths within a
+        # power of two), so one long ticker cannot pad every other one to its
+        # length.
+        self.count = np.zeros(seg.n + len(seg.starts), dtype=np.int64)
+        self.total = np.zeros(seg.n + len(seg.starts))
+        at = seg.pos + self.offset + 1
+        size = np.ceil(np.log2(np.maximum(seg.lengths, 1))).astype(np.int64)
+        row_size = np.repeat(size, seg.lengths)
+        for c in np.unique(size):
+            members = size == c
+            rank = np.repeat(np.arange(members.sum()), seg.lengths[members])
+            width = seg.lengths[members].max()
+            rows = row_size == c
+            cell = rank * width + (seg.pos[rows] - seg.first[rows])
+            for out, x in ((self.count, valid), (self.total, shifted)):
+                grid = np.zeros((members.sum(), width), dtype=out.dtype)
+                grid.ravel()[cell] = x[rows]
+                np.cumsum(grid, axis=1, out=grid)
+                out[at[rows]] = grid.ravel()[cell]
+
+    def window(self, seg, window):
+        lo = np.maximum(seg.first, seg.pos - window + 1) + self.offset
+        hi = seg.pos + 1 + self.offset
+        return self.count[hi] - self.count[lo], self.total[hi] - self.total[lo]
+
+
+def _pct_change(x, seg, prefix, ind):
+    out = np.full(seg.n, np.nan)
+    inner = seg.pos != seg.first
+    prev = x[seg.pos[inner] - 1]
+    out[inner] = x[inner] / prev - 1
+    return out
+
+
+def _since_first(x, seg, prefix, ind):
+    return x / seg.first_value(ind.source, x) - 1
+
+
+def _rolling_mean(x, seg, prefix, ind):
+    n, total = prefix.window(seg, ind.window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, total / n + prefix.shift, np.nan)
+
+
+def _rolling_std(x, seg, prefix, ind):
+    # Welford's update, run across the window's lags for every row at once:
+    # `window` vectorized steps instead of one Python step per row. Unlike a
+    # sum-of-squares difference it stays accurate when the spread is tiny
+    # relative to the values themselves.
+    n = np.zeros(seg.n)
+    mean = np.zeros(seg.n)
+    m2 = np.zeros(seg.n)
+    for lag in range(ind.window - 1, -1, -1):
+        idx = seg.pos - lag
+        ok = idx >= seg.first
+        v = x[np.where(ok, idx, seg.pos)]
+        ok &= ~np.isnan(v)
+        n += ok
+        delta = np.where(ok, v - mean, 0.0)
+        mean += np.divide(delta, n, out=np.zeros(seg.n), where=ok)
+        m2 += np.where(ok, delta * (v - mean), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+
+
+KINDS = {
+    'pct_change':   _pct_change,
+    'since_first':  _since_first,
+    'rolling_mean': _rolling_mean,
+    'rolling_std':  _rolling_std,
+}
+
+_PREFIXED = {'rolling_mean'}
+
+
+def _evaluate(df, seg, indicators, known=None):
+    values = {}
+    prefixes = {}
+    for ind in indicators:
+        if ind.source not in values:
+            values[ind.source] = df[ind.source].to_numpy(dtype=np.float64)
+        x = values[ind.source]
+        if ind.kind in _PREFIXED and ind.source not in prefixes:
+            prefixes[ind.source] = _Prefix(x, seg)
+        out = KINDS[ind.kind](x, seg, prefixes.get(ind.source), ind)
+        out = out * ind.scale if ind.scale != 1.0 else out
+        if known is not None and ind.name in df:
+            out = np.where(known, df[ind.name].to_numpy(dtype=np.float64), out)
+        values[ind.name] = out
+    return {ind.name: values[ind.name] for ind in indicators}
+
+
+def compute_indicators(df, indicators=INDICATORS):
+    """
+    Add every indicator column to `df`, which must be sorted by Ticker, Date.
+
+    All tickers are processed together on whole-frame NumPy arrays, using the
+    ticker boundaries as offsets, rather than one groupby lambda per ticker per
+    indicator. Rolling means over the same source share one set of running
+    sums and rolling standard deviations use Welford's update. Windows follow
+    pandas' min_periods=1 semantics and the standard deviation uses ddof=1, so
+    results match the groupby/rolling version to float tolerance.
+    """
+    seg = _Segments(df['Ticker'].to_numpy())
+    return df.assign(**_evaluate(df, seg, indicators))
+
+
+def _state_columns(indicators):
+    sources = list(dict.fromkeys(ind.source for ind in indicators))
+    anchored = list(dict.fromkeys(
+        ind.source for ind in indicators if ind.kind == 'since_first'
+    ))
+    depth = max([ind.window or 1 for ind in indicators] + [2]) - 1
+    return sources, anchored, depth
+
+
+class IndicatorState:
+    """
+    Per-ticker state needed to extend the indicator columns with new bars.
+
+    `tail` holds each ticker's last rows of every source column (the longest
+    window minus one, so every window ending on a new bar is covered) plus a
+    First_<source> column with the ticker's first value for since_first
+    indicators. Window sums are re-derived from these buffers on each update
+    rather than carried forward, so repeated updates don't drift away from a
+    full recompute.
+    """
+
+    def __init__(self, tail, indicators=INDICATORS):
+        self.tail = tail
+        self.indicators = indicators
+
+    @classmethod
+    def from_frame(cls, df, indicators=INDICATORS):
+        """Build the state from a full indicator frame sorted by Ticker, Date."""
+        return cls(cls._tail_of(df, _Segments(df['Ticker'].to_numpy()), indicators), indicators)
+
+    @staticmethod
+    def _tail_of(df, seg, indicators, anchors=None):
+        sources, anchored, depth = _state_columns(indicators)
+        keep = seg.pos - seg.first >= np.repeat(seg.lengths, seg.lengths) - depth
+        tail = df.loc[keep, ['Ticker', 'Date'] + sources].reset_index(drop=True)
+        tail['Ticker'] = tail['Ticker'].astype(str)
+        for src in anchored:
+            first = anchors[src] if anchors else df[src].to_numpy(dtype=np.float64)[seg.first]
+            tail['First_' + src] = first[keep]
+        return tail
+
+    def last_dates(self):
+        """Date of the last bar the state has seen, per ticker."""
+        return self.tail.groupby('Ticker')['Date'].max()
+
+    def extend(self, new):
+        """
+        Compute the indicator columns for `new` bars and advance the state.
+
+        Every bar in `new` must be later than the state's last date for its
+        ticker; tickers the state has never seen start from their first new
+        bar. Returns `new` sorted by Ticker, Date with the indicator columns.
+        """
+        sources, anchored, _ = _state_columns(self.indicators)
+        new = new.assign(Ticker=new['Ticker'].astype(str))
+        new = new.sort_values(['Ticker', 'Date'], kind='mergesort', ignore_index=True)
+
+        inputs = [c for c in sources if c in new]
+        ext = pd.concat([
+            self.tail.assign(_context=True),
+            new[['Ticker', 'Date'] + inputs].assign(_context=False),
+        ], ignore_index=True)
+        ext = ext.sort_values(['Ticker', 'Date'], kind='mergesort', ignore_index=True)
+
+        seg = _Segments(ext['Ticker'].to_numpy())
+        anchors = {}
+        for src in anchored:
+            stored = ext['First_' + src].to_numpy(dtype=np.float64)[seg.first]
+            fresh = ext[src].to_numpy(dtype=np.float64)[seg.first]
+            anchors[src] = np.where(np.isnan(stored), fresh, stored)
+        seg.anchors = anchors
+
+        known = ext['_context'].to_numpy(dtype=bool)
+        values = _evaluate(ext, seg, self.indicators, known=known)
+        ext = ext.assign(**values)
+
+        self.tail = self._tail_of(ext, seg, self.indicators, anchors)
+        return new.assign(**{name: col[~known] for name, col in values.items()})
@@ -0,0 +1,331 @@
+import argparse
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One trade. `emitted` is the perf_counter() time the source produced it,
+# from which ingest and update latency are measured.
+Tick = namedtuple('Tick', ['ticker', 'time', 'price', 'volume', 'emitted'])
+
+TICK_COLUMNS = ['Ticker', 'Time', 'Price', 'Volume']
+
+# The regular session simulated trades fall in, from midnight.
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_LENGTH = pd.Timedelta(hours=6, minutes=30)
+
+
+def session_time(start, seconds):
+    """
+    The market time `seconds` of trading after `start`, counting regular
+    sessions only: past the close the clock carries on from the next
+    business day's open, so no trade lands overnight or on a weekend.
+    """
+    day = start.normalize()
+    into = min(max(start - day - SESSION_OPEN, pd.Timedelta(0)), SESSION_LENGTH)
+    if not pd.offsets.BDay().is_on_offset(day):
+        day, into = pd.offsets.BDay().rollforward(day), pd.Timedelta(0)
+    days, rest = divmod(into.total_seconds() + seconds, SESSION_LENGTH.total_seconds())
+    return day + pd.offsets.BDay(int(days)) + SESSION_OPEN + pd.Timedelta(seconds=rest)
+
+
+class SimulatedSource:
+    """
+    Random-walk trades for every ticker, starting from its last close, with
+    no network. Ticks are spread evenly over the tickers at `rate` per second
+    of wall time, and the market clock runs `speed` times faster than that
+    from `start` (by default 09:30 on the next business day), through
+    regular sessions only (see session_time()).
+    """
+
+    def __init__(self, last_close, rate=50.0, speed=60.0, start=None, sigma=0.0004,
+                 seed=0, batch_s=0.05):
+        self.last_close = dict(last_close)
+        self.rate = rate
+        self.speed = speed
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.sigma = sigma
+        self.seed = seed
+        self.batch_s = batch_s
+
+    def ticks(self, stop):
+        rng = np.random.default_rng(self.seed)
+        tickers = list(self.last_close)
+        prices = np.array([self.last_close[t] for t in tickers], dtype=np.float64)
+        start = self.start or (pd.Timestamp.now().normalize() + pd.offsets.BDay(1)
+                               + SESSION_OPEN)
+        max_batch = max(1, int(self.rate * self.batch_s * 2))
+        t0 = time.perf_counter()
+        sent = 0
+        while not stop.is_set():
+            behind = int((time.perf_counter() - t0) * self.rate) - sent
+            if behind <= 0:
+                stop.wait(self.batch_s)
+                continue
+            # A saturated consumer slows the source down instead of being
+            # handed ever larger catch-up batches: ticks past max_batch stay
+            # owed and go out in later batches, none are dropped.
+            due = min(behind, max_batch)
+            idx = rng.integers(0, len(tickers), due)
+            steps = np.exp(self.sigma * rng.standard_normal(due))
+            emitted = time.perf_counter()
+            clock = session_time(start, (emitted - t0) * self.speed)
+            batch = []
+            for i, step in zip(idx, steps):
+                prices[i] *= step
+                batch.append(Tick(tickers[i], clock, float(prices[i]),
+                                  int(rng.integers(1, 50)) * 100, emitted))
+            sent += due
+            yield batch
+
+
+class ReplaySource:
+    """
+    Replays recorded trades (TICK_COLUMNS) in Time order, `speed` times
+    faster than they happened; speed=None replays them as fast as possible.
+    """
+
+    def __init__(self, frame, speed=1.0, batch_s=0.05):
+        self.frame = frame.sort_values('Time', kind='mergesort').reset_index(drop=True)
+        self.speed = speed
+        self.batch_s = batch_s
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(read_ticks(path), **kwargs)
+
+    def ticks(self, stop):
+        times = self.frame['Time'].to_numpy()
+        offsets = (times - times[0]) / np.timedelta64(1, 's') if len(times) else times
+        rows = list(zip(self.frame['Ticker'].astype(str), self.frame['Time'],
+                        self.frame['Price'].astype(float), self.frame['Volume'].astype(int)))
+        t0 = time.perf_counter()
+        i = 0
+        while i < len(rows) and not stop.is_set():
+            if self.speed is None:
+                j = min(len(rows), i + 1000)
+            else:
+                now = (time.perf_counter() - t0) * self.speed
+                j = int(np.searchsorted(offsets, now, side='right'))
+                if j == i:
+                    stop.wait(min(self.batch_s, (offsets[i] - now) / self.speed))
+                    continue
+            emitted = time.perf_counter()
+            yield [Tick(*row, emitted) for row in rows[i:j]]
+            i = j
+
+
+def read_ticks(path):
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, parse_dates=['Time'], date_format='ISO8601')
+    return df[TICK_COLUMNS]
+
+
+class LiveBook:
+    """
+    Today's bar per ticker, built from ticks, shared by every session.
+
+    apply() is called from the ingestion thread; sessions block in wait()
+    until the book moves past the version they last showed, and get back
+    only the tickers that changed since then.
+    """
+
+    LATENCY_SAMPLES = 2048
+
+    def __init__(self):
+        self.version = 0
+        self.bars = {}
+        self.ticks = 0
+        self.done = False
+        self.started = time.perf_counter()
+        self._changed = {}
+        self._emitted = deque(maxlen=self.LATENCY_SAMPLES)
+        self._ingest_latency = deque(maxlen=self.LATENCY_SAMPLES)
+        self._update_latency = deque(maxlen=self.LATENCY_SAMPLES)
+        self._cond = threading.Condition()
+
+    def apply(self, batch):
+        if not batch:
+            return
+        with self._cond:
+            self.version += 1
+            for tick in batch:
+                bar = self.bars.get(tick.ticker)
+                date = tick.time.normalize()
+                if bar is None or bar['Date'] != date:
+                    bar = {'Date': date, 'Open': tick.price, 'High': tick.price,
+                           'Low': tick.price, 'Volume': 0}
+                bar = dict(bar, Close=tick.price, Time=tick.time,
+                           High=max(bar['High'], tick.price),
+                           Low=min(bar['Low'], tick.price),
+                           Volume=bar['Volume'] + tick.volume)
+                self.bars[tick.ticker] = bar
+                self._changed[tick.ticker] = self.version
+            self.ticks += len(batch)
+            oldest = min(t.emitted for t in batch)
+            self._emitted.append((self.version, oldest))
+            self._ingest_latency.append(time.perf_counter() - oldest)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """(version, {ticker: bar}) of every ticker seen so far."""
+        with self._cond:
+            return self.version, dict(self.bars)
+
+    def wait(self, since, timeout):
+        """
+        Block until the book is past version `since` or `timeout` seconds
+        pass. Returns (version, {ticker: bar} changed since `since`, the
+        emit time of the oldest tick among those changes or None).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since or self.done, timeout)
+            if self.version <= since:
+                return self.version, {}, None
+            changed = {t: self.bars[t] for t, v in self._changed.items() if v > since}
+            oldest = None
+            for version, emitted in reversed(self._emitted):
+                if version <= since:
+                    break
+                oldest = emitted if oldest is None else min(oldest, emitted)
+            return self.version, changed, oldest
+
+    def record_update(self, seconds):
+        """End-to-end latency of one pushed update, from tick emission."""
+        with self._cond:
+            self._update_latency.append(seconds)
+
+    def stats(self):
+        with self._cond:
+            elapsed = time.perf_counter() - self.started
+            stats = {'ticks': self.ticks, 'ticks_per_s': self.ticks / elapsed if elapsed else 0.0,
+                     'tickers': len(self.bars), 'version': self.version}
+            for name, samples in (('ingest', self._ingest_latency),
+                                  ('update', self._update_latency)):
+                if samples:
+                    ms = np.asarray(samples) * 1e3
+                    stats[f'{name}_p50_ms'] = float(np.percentile(ms, 50))
+                    stats[f'{name}_p95_ms'] = float(np.percentile(ms, 95))
+            return stats
+
+
+def start_ingest(source, book):
+    """Feed `source` into `book` from a daemon thread; set the returned event to stop."""
+    stop = threading.Event()
+
+    def run():
+        try:
+            for batch in source.ticks(stop):
+                book.apply(batch)
+        finally:
+            book.finish()
+
+    threading.Thread(target=run, name='live-ingest', daemon=True).start()
+    return stop
+
+
+def live_summary(summary, bars):
+    """
+    A copy of the summary with each ticker in `bars` moved to its live
+    price and date. Returns are rescaled from the stored close, so a 1% move today
+    adds 1% of (1 + return) to the 1Y and YTD figures; volatility is left
+    as of the last close.
+    """
+    live = summary.copy()
+    rows = live['Ticker'].isin(list(bars))
+    if not rows.any():
+        return live
+    price = live.loc[rows, 'Ticker'].map(lambda t: bars[t]['Close'])
+    move = price / live.loc[rows, 'Latest_Price']
+    for col in ('1Y_Return_%', 'YTD_Return_%'):
+        live.loc[rows, col] = ((1 + live.loc[rows, col] / 100) * move - 1) * 100
+    live.loc[rows, 'Latest_Price'] = price
+    live.loc[rows, 'Latest_Date'] = live.loc[rows, 'Ticker'].map(
+        lambda t: bars[t]['Date'].strftime('%Y-%m-%d'))
+    return live
+
+
+def measure(tickers=64, rate=20000.0, seconds=5.0, subscribers=4):
+    """
+    Run the simulator into a LiveBook at `rate` ticks/s for `seconds`, with
+    `subscribers` threads waiting on the book the way dashboard sessions do
+    and rebuilding the live summary on every update.
+    """
+    base = {f'SYN{i:04d}': 100.0 + i for i in range(tickers)}
+    summary = pd.DataFrame({
+        'Ticker': list(base), 'Company': [f'Synthetic {i:04d}' for i in range(tickers)],
+        'Latest_Price': list(base.values()), '1Y_Return_%': 10.0, 'YTD_Return_%': 5.0,
+    })
+    book = LiveBook()
+    stop = start_ingest(SimulatedSource(base, rate=rate), book)
+    updates = []
+
+    def subscriber():
+        seen = 0
+        while not book.done:
+            seen, changed, oldest = book.wait(seen, 0.5)
+            if changed:
+                live_summary(summary, changed)
+                book.record_update(time.perf_counter() - oldest)
+                updates.append(len(changed))
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(subscribers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    stats = book.stats()
+    stats['updates'] = len(updates)
+    stats['tickers_per_update'] = float(np.mean(updates)) if updates else 0.0
+    return stats
+
+
+def record(path, tickers=8, rate=50.0, seconds=10.0):
+    """Save `seconds` of simulated trades to `path` for a ReplaySource."""
+    base = {f'SYN{i:04d}': 100.0 + i for i in range(tickers)}
+    source = SimulatedSource(base, rate=rate)
+    stop = threading.Event()
+    timer = threading.Timer(seconds, stop.set)
+    timer.start()
+    rows = [t[:4] for batch in source.ticks(stop) for t in batch]
+    df = pd.DataFrame(rows, columns=TICK_COLUMNS)
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure live tick ingestion offline, or record simulated ticks for replay.")
+    parser.add_argument('--tickers', type=int, default=64,
+                        help="simulated tickers (default: 64)")
+    parser.add_argument('--rate', type=float, default=20000.0,
+                        help="simulated ticks per second (default: 20000)")
+    parser.add_argument('--seconds', type=float, default=5.0,
+                        help="how long to run (default: 5)")
+    parser.add_argument('--subscribers', type=int, default=4,
+                        help="threads consuming updates like dashboard sessions (default: 4)")
+    parser.add_argument('--record', metavar='PATH',
+                        help="instead, save simulated ticks to PATH (.csv or .parquet)")
+    args = parser.parse_args()
+
+    if args.record:
+        n = record(args.record, args.tickers, args.rate, args.seconds)
+        print(f"{n} ticks saved to {args.record}")
+    else:
+        stats = measure(args.tickers, args.rate, args.seconds, args.subscribers)
+        for key, value in stats.items():
+            print(f"{key:<20}{value:,.2f}" if isinstance(value, float) else f"{key:<20}{value:,}")
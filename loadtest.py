@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import store
+from benchmark import DASHBOARD_SCRIPT, DEFAULT_DAYS, _dashboard, synthetic_store
+from timing import process_rss
+
+# Concurrent sessions at each level of the default run.
+DEFAULT_SESSIONS = (1, 4, 16)
+DEFAULT_TICKERS = 64
+DEFAULT_ACTIONS = 20
+
+# What a simulated user does between reruns, and how often.
+ACTIONS = {
+    'date_range':    3,
+    'stocks':        3,
+    'tab':           3,
+    'price_company': 2,
+    'watchlist':     2,
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@contextmanager
+def _share_server_state():
+    """
+    Let several AppTests run at once in this process, sharing what the
+    Streamlit server shares between its sessions, until the block exits.
+
+    AppTest assumes one session at a time. It installs a mock Runtime for
+    the length of each run and removes it again, so one session finishing
+    would pull the runtime from under another session's script thread,
+    which then hangs. Runtime lookups return one shared mock instead, set
+    up like AppTest's own. Each run also compiles the script into a fresh
+    ScriptCache, where the server compiles it once; concurrent compile()
+    calls can fail on some Python versions, so every run shares one cache
+    as on the server. The originals are put back on exit.
+    """
+    from unittest.mock import MagicMock, patch
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import (
+        MemoryCacheStorageManager,
+    )
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    script_cache = ScriptCache()
+    with patch.object(Runtime, 'instance', classmethod(lambda cls: shared)), \
+            patch.object(Runtime, 'exists', classmethod(lambda cls: True)), \
+            patch.object(local_script_runner, 'ScriptCache', lambda: script_cache):
+        yield
+
+
+class Session:
+    """
+    One simulated browser session: an AppTest of dashboard.py driven by a
+    seeded random sequence of the interactions a user has in the sidebar,
+    the chart tabs, the Price History selectbox and the watchlist.
+    """
+
+    def __init__(self, seed, companies, first_date, last_date):
+        self.rng = random.Random(seed)
+        self.companies = companies
+        self.first_date, self.last_date = first_date, last_date
+        self.at = None
+        self.reruns = []
+        self.errors = []
+
+    def _rerun(self, action):
+        t0 = time.perf_counter()
+        self.at.run()
+        elapsed = time.perf_counter() - t0
+        if self.at.exception:
+            self.errors.append((action, self.at.exception[0].message))
+        elif not self.at.date_input:
+            self.errors.append((action, "the page rendered without its widgets"))
+        else:
+            self.reruns.append((action, elapsed))
+
+    def open(self):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(DASHBOARD_SCRIPT, default_timeout=120)
+        self._rerun('open')
+
+    def act(self):
+        at, rng = self.at, self.rng
+        if at.exception:
+            return
+        action = rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        if action == 'date_range':
+            span = timedelta(days=rng.choice([30, 90, 365, 730]))
+            end = self.last_date - timedelta(days=rng.randrange(0, 120))
+            at.date_input[0].set_value((max(end - span, self.first_date), end))
+        elif action == 'stocks':
+            at.multiselect[0].set_value(rng.sample(self.companies, rng.randint(1, 6)))
+        elif action == 'tab':
+            at.radio[0].set_value(rng.choice(at.radio[0].options))
+        elif action == 'price_company':
+            if at.radio[0].value != "Price History":
+                at.radio[0].set_value("Price History")
+                self._rerun('tab')
+            box = at.selectbox[0]
+            box.set_value(rng.choice(box.options))
+        elif action == 'watchlist':
+            # The watchlist cards are display-only, so a filter click is
+            # simulated through the session state the click would set.
+            selected = at.multiselect[0].value
+            at.session_state['active_filters'] = set(
+                rng.sample(selected, rng.randint(0, len(selected))))
+        self._rerun(action)
+
+
+def _sample_rss(stop, peak):
+    while not stop.wait(0.05):
+        peak[0] = max(peak[0], process_rss())
+
+
+def run_level(n_sessions, actions, companies, first_date, last_date, seed=0, think=0.0):
+    """
+    Run `n_sessions` sessions at once, one thread each as in the Streamlit
+    server, each opening the page and then making `actions` interactions.
+    """
+    sessions = [Session(seed + i, companies, first_date, last_date)
+                for i in range(n_sessions)]
+    start = threading.Barrier(n_sessions)
+
+    def user(session):
+        start.wait()
+        try:
+            session.open()
+            for _ in range(actions):
+                if think:
+                    time.sleep(session.rng.uniform(0, 2 * think))
+                session.act()
+        except Exception as exc:
+            session.errors.append(('harness', repr(exc)))
+
+    rss_before = process_rss()
+    peak = [rss_before]
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_rss, args=(stop, peak), daemon=True)
+    sampler.start()
+    threads = [threading.Thread(target=user, args=(s,)) for s in sessions]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    stop.set()
+    sampler.join()
+
+    reruns = [r for s in sessions for r in s.reruns]
+    errors = [e for s in sessions for e in s.errors]
+    return {
+        'sessions': n_sessions,
+        'reruns': len(reruns),
+        'errors': len(errors),
+        'first_errors': errors[:3],
+        'wall_s': wall,
+        'reruns_per_s': len(reruns) / wall,
+        'latency_ms': latency_summary([t for _, t in reruns]),
+        'by_action_ms': {
+            action: latency_summary([t for a, t in reruns if a == action])
+            for action in ['open', *ACTIONS]
+            if any(a == action for a, _ in reruns)
+        },
+        'rss_before_mb': rss_before / 1e6,
+        'rss_peak_mb': peak[0] / 1e6,
+        'rss_after_mb': process_rss() / 1e6,
+    }
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1e3
+    summary = {f'p{p}': float(np.percentile(ms, p)) for p in PERCENTILES}
+    summary['max'] = float(ms.max())
+    return summary
+
+
+def run(session_counts=DEFAULT_SESSIONS, n_tickers=DEFAULT_TICKERS, days=DEFAULT_DAYS,
+        actions=DEFAULT_ACTIONS, in_memory=False, seed=0, think=0.0):
+    """Every concurrency level against one synthetic universe, lowest first."""
+    _dashboard()
+    os.environ['DASHBOARD_DATA'] = 'memory' if in_memory else 'query'
+    levels = []
+    with _share_server_state(), synthetic_store(n_tickers, days) as companies:
+        first, last = (d.date() for d in store.date_bounds(store.CLEANED_DIR))
+        for n in session_counts:
+            print(f"{n} concurrent session{'s' if n != 1 else ''} x {actions} interactions.")
+            levels.append(run_level(n, actions, companies, first, last, seed, think))
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'tickers': n_tickers,
+        'days': days,
+        'actions': actions,
+        'data': 'memory' if in_memory else 'query',
+        'levels': levels,
+    }
+
+
+def print_report(report):
+    cols = ''.join(f"{f'p{p} ms':>10}" for p in PERCENTILES)
+    print(f"\n{'sessions':>8}{'reruns':>8}{'errors':>8}{'reruns/s':>10}{cols}"
+          f"{'max ms':>10}{'RSS MB':>9}{'peak MB':>9}")
+    for lv in report['levels']:
+        lat = lv['latency_ms']
+        pcts = ''.join(f"{lat.get(f'p{p}', float('nan')):>10.1f}" for p in PERCENTILES)
+        print(f"{lv['sessions']:>8}{lv['reruns']:>8}{lv['errors']:>8}{lv['reruns_per_s']:>10.1f}"
+              f"{pcts}{lat.get('max', float('nan')):>10.1f}"
+              f"{lv['rss_after_mb']:>9.0f}{lv['rss_peak_mb']:>9.0f}")
+    last = report['levels'][-1]
+    print(f"\nBy interaction at {last['sessions']} sessions (p50 / p95 ms):")
+    for action, lat in last['by_action_ms'].items():
+        print(f"  {action:<14}{lat['p50']:>8.1f}{lat['p95']:>9.1f}")
+    for lv in report['levels']:
+        for action, message in lv['first_errors']:
+            print(f"  error in {action} at {lv['sessions']} sessions: {message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent simulated sessions against dashboard.py on synthetic data.")
+    parser.add_argument('--sessions', type=int, nargs='+', default=list(DEFAULT_SESSIONS),
+                        help=f"concurrent sessions per level (default: "
+                             f"{' '.join(map(str, DEFAULT_SESSIONS))})")
+    parser.add_argument('--actions', type=int, default=DEFAULT_ACTIONS,
+                        help=f"interactions per session after opening the page "
+                             f"(default: {DEFAULT_ACTIONS})")
+    parser.add_argument('--tickers', type=int, default=DEFAULT_TICKERS,
+                        help=f"synthetic tickers (default: {DEFAULT_TICKERS})")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS,
+                        help=f"trading days per ticker (default: {DEFAULT_DAYS})")
+    parser.add_argument('--think', type=float, default=0.0,
+                        help="mean pause between a session's interactions, in seconds "
+                             "(default: 0, back to back)")
+    parser.add_argument('--memory', action='store_true',
+                        help="load the whole history per process (DASHBOARD_DATA=memory)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='loadtest.json',
+                        help="where to save the results as JSON (default: loadtest.json)")
+    args = parser.parse_args()
+
+    report = run(args.sessions, args.tickers, args.days, args.actions,
+                 args.memory, args.seed, args.think)
+    print_report(report)
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=1)
+    print(f"Results saved to {args.output}")
@@ -0,0 +1,257 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import clean_data
+import fetch_data
+import store
+from benchmark import DEFAULT_DAYS, synthetic_ohlcv
+from loadtest import latency_summary
+
+# Trading days cleaned in full before the replay starts: a year, so the
+# 200-day windows are already filled when the incremental runs take over.
+DEFAULT_WARMUP = 252
+
+
+class ClockedSource(fetch_data.FrameSource):
+    """
+    A FrameSource that serves no bar dated after `clock`. The replay moves
+    the clock forward, so each incremental fetch only sees the bars that
+    would have been published by then.
+    """
+
+    def __init__(self, df, clock=None):
+        super().__init__(df)
+        self.clock = clock
+
+    def history(self, ticker_sym, start_date, end_date, timeout):
+        end = min(pd.Timestamp(end_date), self.clock + pd.Timedelta(days=1))
+        return super().history(ticker_sym, start_date, end, timeout)
+
+
+def replay_clocks(dates, warmup=DEFAULT_WARMUP, step=1, limit=None):
+    """The trading days after the warm-up at which the pipeline runs, every `step` days."""
+    if warmup < 1 or warmup >= len(dates):
+        raise ValueError(f"warm-up of {warmup} days leaves nothing to replay "
+                         f"from {len(dates)} trading days")
+    clocks = list(dates[warmup - 1::step][1:])
+    if clocks[-1] != dates[-1]:
+        clocks.append(dates[-1])
+    return clocks[:limit]
+
+
+def _part_files_per_ticker(root):
+    tickers = store.tickers(root)
+    files = sum(len(os.listdir(os.path.join(root, t))) for t in tickers)
+    return files / len(tickers) if tickers else 0.0
+
+
+def replay(raw, warmup=DEFAULT_WARMUP, step=1, speed=None, limit=None, verify=True):
+    """
+    Replay the bars in `raw` (the raw schema) through the pipeline, in time
+    order, in a scratch directory; the repo's data/ is never touched.
+
+    The first `warmup` trading days are fetched and cleaned in full. From
+    then on a clock moves forward `step` trading days at a time and each
+    tick runs what a scheduled refresh runs: an incremental
+    fetch_stock_data() from a ClockedSource, then update_cleaned_data(),
+    which extends the indicators and the rollups and rewrites the summary
+    and manifest. With `speed`, market time runs that many times faster than
+    wall time and each refresh waits for its bars to be due; a pipeline
+    that cannot keep up falls behind, which is reported as lag. speed=None
+    replays as fast as the pipeline goes.
+
+    After every refresh the summary must show the clock's date and the data
+    version must have changed. With verify=True the store built up
+    incrementally is finally checked against a full recompute.
+    """
+    raw = raw.sort_values(['Date', 'Ticker'], kind='mergesort', ignore_index=True)
+    dates = pd.DatetimeIndex(raw['Date'].unique())
+    clocks = replay_clocks(dates, warmup, step, limit)
+    names = dict(zip(raw['Ticker'].astype(str), raw['Company'].astype(str)))
+    source = ClockedSource(raw, clock=dates[warmup - 1])
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs('data')
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                store.write_raw(raw[raw['Date'] <= source.clock])
+                clean_data.clean_and_transform_data()
+            warmup_s = time.perf_counter() - t0
+            version = store.data_version()
+            print(f"Replaying {len(clocks)} refreshes of {len(names)} tickers from "
+                  f"{clocks[0].date()} to {clocks[-1].date()} after a {warmup}-day warm-up "
+                  f"({warmup_s:.1f} s).")
+
+            steps = []
+            start = source.clock
+            t0 = time.perf_counter()
+            for clock in clocks:
+                lag = 0.0
+                if speed:
+                    wait = t0 + (clock - start).total_seconds() / speed - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    lag = max(0.0, -wait)
+                source.clock = clock
+                t1 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    written = fetch_data.fetch_stock_data(
+                        incremental=True, tickers=names, source=source, rate=1e6,
+                        end_date=(clock + pd.Timedelta(days=1)).to_pydatetime())
+                    t2 = time.perf_counter()
+                    clean_data.update_cleaned_data()
+                t3 = time.perf_counter()
+
+                latest = store.read_summary()['Latest_Date'].max()
+                previous, version = version, store.data_version()
+                steps.append({
+                    'date': clock.date().isoformat(),
+                    'bars': sum(written.values()),
+                    'fetch_s': t2 - t1,
+                    'update_s': t3 - t2,
+                    'lag_s': lag,
+                    'stale': latest != clock.strftime('%Y-%m-%d') or version == previous,
+                })
+            wall = time.perf_counter() - t0
+            part_files = _part_files_per_ticker(store.CLEANED_DIR)
+
+            checks = {}
+            if verify:
+                checks['cleaned'] = clean_data.verify_cleaned_data()
+                incremental = store.read_summary()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    clean_data.clean_and_transform_data()
+                checks['summary'] = _same_summary(incremental, store.read_summary())
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'tickers': len(names),
+        'warmup_days': warmup,
+        'step_days': step,
+        'speed': speed,
+        'warmup_s': warmup_s,
+        **throughput(steps, wall),
+        'cleaned_part_files_per_ticker': part_files,
+        'checks': checks,
+        'steps': steps,
+    }
+
+
+def _same_summary(incremental, full):
+    match = True
+    try:
+        pd.testing.assert_frame_equal(incremental, full, check_exact=False, rtol=1e-9)
+    except AssertionError as exc:
+        print(f"✗ Summary differs from a full recompute: {str(exc).splitlines()[0]}")
+        match = False
+    else:
+        print("✓ Summary matches a full recompute")
+    return match
+
+
+def throughput(steps, wall):
+    """
+    Sustained rates over the replay, per-refresh latency, and the slowdown
+    from the first to the last tenth of the refreshes: a store that gets
+    slower to update as it grows shows up there before it shows up in the
+    medians.
+    """
+    total = [s['fetch_s'] + s['update_s'] for s in steps]
+    tenth = max(1, len(total) // 10)
+    first, last = np.median(total[:tenth]), np.median(total[-tenth:])
+    bars = sum(s['bars'] for s in steps)
+    return {
+        'refreshes': len(steps),
+        'bars': bars,
+        'wall_s': wall,
+        'bars_per_s': bars / wall if wall else 0.0,
+        'refreshes_per_s': len(steps) / wall if wall else 0.0,
+        'refresh_ms': latency_summary(total),
+        'fetch_ms': latency_summary([s['fetch_s'] for s in steps]),
+        'update_ms': latency_summary([s['update_s'] for s in steps]),
+        'max_lag_s': max(s['lag_s'] for s in steps),
+        'slowdown': float(last / first) if first else 0.0,
+        'stale_refreshes': sum(s['stale'] for s in steps),
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"\n{report['refreshes']} refreshes, {report['bars']:,} bars in {report['wall_s']:.1f} s: "
+          f"{report['bars_per_s']:,.0f} bars/s, {report['refreshes_per_s']:.1f} refreshes/s")
+    print(f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage in ('fetch', 'update', 'refresh'):
+        lat = report[f'{stage}_ms']
+        print(f"{stage:<10}{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['max']:>10.1f}")
+    print(f"\nLast tenth vs first tenth of refreshes: {report['slowdown']:.2f}x "
+          f"({report['cleaned_part_files_per_ticker']:.0f} cleaned part files per ticker)")
+    if report['speed']:
+        print(f"Speed-up {report['speed']:g}x, maximum lag behind schedule "
+              f"{report['max_lag_s']:.2f} s")
+    print(f"Stale refreshes: {report['stale_refreshes']}")
+    if baseline:
+        print(f"vs baseline: bars/s {report['bars_per_s'] / baseline['bars_per_s']:.2f}x, "
+              f"p50 refresh {report['refresh_ms']['p50'] / baseline['refresh_ms']['p50']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay recorded bars through the incremental fetch, clean and summary "
+                    "paths, offline.")
+    parser.add_argument('--raw', default=store.RAW_DIR,
+                        help=f"raw store to replay (default: {store.RAW_DIR})")
+    parser.add_argument('--synthetic', type=int, metavar='TICKERS',
+                        help="instead, replay this many synthetic tickers")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS,
+                        help=f"with --synthetic, trading days per ticker (default: {DEFAULT_DAYS})")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+                        help=f"trading days cleaned in full before the replay "
+                             f"(default: {DEFAULT_WARMUP})")
+    parser.add_argument('--step', type=int, default=1,
+                        help="trading days per refresh (default: 1)")
+    parser.add_argument('--speed', type=float,
+                        help="market time per wall time, e.g. 86400 for a day per second "
+                             "(default: as fast as possible)")
+    parser.add_argument('--limit', type=int,
+                        help="stop after this many refreshes")
+    parser.add_argument('--no-verify', action='store_true',
+                        help="skip the check against a full recompute at the end")
+    parser.add_argument('--output', default='replay.json',
+                        help="where to save the results as JSON (default: replay.json)")
+    parser.add_argument('--compare', metavar='JSON',
+                        help="earlier results to show the throughput ratio against")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        raw = synthetic_ohlcv(args.synthetic, args.days)
+    else:
+        raw = store.read_raw(root=args.raw)
+    report = replay(raw, args.warmup, args.step, args.speed, args.limit,
+                    verify=not args.no_verify)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=1)
+    print(f"Results saved to {args.output}")
+    ok = all(report['checks'].values()) and not report['stale_refreshes']
+    raise SystemExit(0 if ok else 1)
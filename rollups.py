@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Coarser resolutions kept next to the daily store: key -> pandas period.
+# Weeks end on Friday, the last trading day of a regular week.
+ROLLUPS = {
+    'W': 'W-FRI',
+    'M': 'M',
+}
+
+# Indicator columns sampled at each period's last bar.
+POINT_COLUMNS = ['Cumulative_Return', 'MA_50', 'MA_200', 'Volatility_30D']
+
+
+def build_rollup(df, freq):
+    """
+    One bar per ticker and period from a cleaned frame sorted by Ticker, Date.
+
+    Open is the period's first open, High/Low the extremes, Close the last
+    close and Volume the total, so the bars are exact aggregates of the daily
+    ones. Each bar is dated on the period's last trading day and carries the
+    indicator values of that day. Periods are found from ticker and period
+    boundaries in one pass, then reduced with reduceat.
+    """
+    if df.empty:
+        return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume',
+                   'Ticker', 'Company'] + POINT_COLUMNS].copy()
+    codes = pd.factorize(df['Ticker'])[0]
+    ordinal = df['Date'].dt.to_period(ROLLUPS[freq]).array.asi8
+    n = len(df)
+    new = np.ones(n, dtype=bool)
+    new[1:] = (codes[1:] != codes[:-1]) | (ordinal[1:] != ordinal[:-1])
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], n) - 1
+
+    bars = df.iloc[ends][['Date', 'Close', 'Ticker', 'Company'] + POINT_COLUMNS]
+    bars = bars.reset_index(drop=True)
+    bars['Open'] = df['Open'].to_numpy(dtype=np.float64)[starts]
+    bars['High'] = np.fmax.reduceat(df['High'].to_numpy(dtype=np.float64), starts)
+    bars['Low'] = np.fmin.reduceat(df['Low'].to_numpy(dtype=np.float64), starts)
+    bars['Volume'] = np.add.reduceat(df['Volume'].to_numpy(dtype=np.int64), starts)
+    return bars[['Date', 'Open', 'High', 'Low', 'Close', 'Volume',
+                 'Ticker', 'Company'] + POINT_COLUMNS]
+
+
+def extend_rollup(last, new, freq):
+    """
+    Bars from each ticker's current period on, for cleaned rows `new` sorted
+    by Ticker, Date that continue a rollup whose last bar per ticker is
+    `last`.
+
+    A ticker's first new bar is merged into its last bar when both fall in
+    the same period; otherwise the last bar's period is over and it comes
+    first, as it is. Either way the bars equal what build_rollup() gives for
+    those periods from the whole history, without reading it.
+    """
+    bars = build_rollup(new, freq)
+    if bars.empty or last.empty:
+        return bars
+    prev = last.set_index(last['Ticker'].astype(str))
+    first = ~bars['Ticker'].astype(str).duplicated().to_numpy()
+    heads = bars.index[first]
+    prev = prev.reindex(bars['Ticker'].astype(str).to_numpy()[first])
+    seen = prev['Date'].notna().to_numpy()
+    same = seen & (prev['Date'].dt.to_period(ROLLUPS[freq]).array.asi8
+                   == bars.loc[heads, 'Date'].dt.to_period(ROLLUPS[freq]).array.asi8)
+
+    at, merged = heads[same], prev[same]
+    bars.loc[at, 'Open'] = merged['Open'].to_numpy()
+    bars.loc[at, 'High'] = np.fmax(merged['High'].to_numpy(), bars.loc[at, 'High'].to_numpy())
+    bars.loc[at, 'Low'] = np.fmin(merged['Low'].to_numpy(), bars.loc[at, 'Low'].to_numpy())
+    bars.loc[at, 'Volume'] += merged['Volume'].to_numpy(dtype=np.int64)
+
+    closed = prev[seen & ~same].reset_index(drop=True)[bars.columns]
+    bars = pd.concat([closed, bars], ignore_index=True)
+    return bars.sort_values(['Ticker', 'Date'], kind='mergesort', ignore_index=True)
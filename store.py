@@ -0,0 +1,597 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+RAW_DIR = 'data/raw'
+CLEANED_DIR = 'data/cleaned'
+STATE_PATH = 'data/indicator_state.parquet'
+SUMMARY_PATH = 'data/summary_stats.csv'
+ROLLUP_DIRS = {'W': 'data/weekly', 'M': 'data/monthly'}
+MANIFEST_PATH = 'data/manifest.json'
+
+SYMBOL = pa.dictionary(pa.int32(), pa.string())
+
+RAW_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('ns')),
+    ('Open', pa.float64()),
+    ('High', pa.float64()),
+    ('Low', pa.float64()),
+    ('Close', pa.float64()),
+    ('Volume', pa.int64()),
+    ('Ticker', SYMBOL),
+    ('Company', SYMBOL),
+])
+
+CLEANED_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('ns')),
+    ('Open', pa.float64()),
+    ('High', pa.float64()),
+    ('Low', pa.float64()),
+    ('Close', pa.float64()),
+    ('Volume', pa.int64()),
+    ('Ticker', SYMBOL),
+    ('Company', SYMBOL),
+    ('Daily_Return', pa.float64()),
+    ('Cumulative_Return', pa.float64()),
+    ('MA_50', pa.float64()),
+    ('MA_200', pa.float64()),
+    ('Volatility_30D', pa.float64()),
+])
+
+# Weekly and monthly bars built from the cleaned store (see rollups.py).
+ROLLUP_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('ns')),
+    ('Open', pa.float64()),
+    ('High', pa.float64()),
+    ('Low', pa.float64()),
+    ('Close', pa.float64()),
+    ('Volume', pa.int64()),
+    ('Ticker', SYMBOL),
+    ('Company', SYMBOL),
+    ('Cumulative_Return', pa.float64()),
+    ('MA_50', pa.float64()),
+    ('MA_200', pa.float64()),
+    ('Volatility_30D', pa.float64()),
+])
+
+# In-memory layout of the cleaned frame in the dashboard. Symbols stay
+# categorical and prices and indicators drop to float32: about seven
+# significant digits, far more than the two decimals anything is shown
+# with. Volume stays int64 because daily volumes exceed the int32 range.
+# The store itself keeps float64 so incremental runs extend the indicators
+# from exact values.
+FRAME_SCHEMA = pa.schema([
+    ('Date', pa.timestamp('ns')),
+    ('Open', pa.float32()),
+    ('High', pa.float32()),
+    ('Low', pa.float32()),
+    ('Close', pa.float32()),
+    ('Volume', pa.int64()),
+    ('Ticker', SYMBOL),
+    ('Company', SYMBOL),
+    ('Daily_Return', pa.float32()),
+    ('Cumulative_Return', pa.float32()),
+    ('MA_50', pa.float32()),
+    ('MA_200', pa.float32()),
+    ('Volatility_30D', pa.float32()),
+])
+
+# Calendar fields are not stored. read_partitions() derives them from Date
+# when they are asked for by name.
+CALENDAR_COLUMNS = {
+    'Year': lambda d: d.dt.year.astype('int16'),
+    'Month': lambda d: d.dt.month.astype('int8'),
+    'Quarter': lambda d: d.dt.quarter.astype('int8'),
+    'Year_Month': lambda d: d.dt.to_period('M').astype(str).astype('category'),
+}
+
+# Memory-mapped reads: Arrow buffers point straight into the page cache
+# instead of being copied into process memory first.
+_FS = pafs.LocalFileSystem(use_mmap=True)
+
+
+def _part_files(root, tickers=None, start=None):
+    if not os.path.isdir(root):
+        return []
+    names = sorted(os.listdir(root)) if tickers is None else sorted(tickers)
+    files = []
+    for name in names:
+        tdir = os.path.join(root, name)
+        if not os.path.isdir(tdir):
+            continue
+        live = _live_parts(tdir)
+        parts = [os.path.abspath(os.path.join(tdir, f)) for f in live + _open_bar(tdir, live)]
+        if start is not None:
+            # Parts are appended in date order, so only the last few can
+            # hold rows from `start` on: stop at the first one that ends
+            # before it instead of opening every part of the ticker.
+            first = len(parts)
+            while first and _file_date_bounds(parts[first - 1])[1] >= start:
+                first -= 1
+            parts = parts[first:]
+        files.extend(parts)
+    return files
+
+
+def _part_range(name):
+    """The first and last part number a part file holds: part-00003.parquet
+    holds part 3, a compacted part-00000-00008.parquet parts 0 to 8."""
+    numbers = name[len('part-'):-len('.parquet')].split('-')
+    return int(numbers[0]), int(numbers[-1])
+
+
+def _next_part(tdir):
+    names = [f for f in os.listdir(tdir) if f.startswith('part-') and f.endswith('.parquet')]
+    return max((_part_range(f)[1] for f in names), default=-1) + 1
+
+
+def _open_bar(tdir, live):
+    """
+    The open bar file of a rollup partition, as a list of at most one name.
+
+    open-00012.parquet holds the bar of the current, still changing period.
+    It is named after the part its bar is appended as once the period
+    closes, and from then on the part holds the bar and the file is skipped.
+    """
+    covered = _part_range(live[-1])[1] if live else -1
+    names = [f for f in os.listdir(tdir) if f.startswith('open-') and f.endswith('.parquet')
+             and int(f[len('open-'):-len('.parquet')]) > covered]
+    return sorted(names)[-1:]
+
+
+def _live_parts(tdir):
+    """
+    The part files of one ticker, in order, leaving out parts that a
+    compacted file already holds (see compact_partition()).
+    """
+    names = [f for f in os.listdir(tdir) if f.startswith('part-') and f.endswith('.parquet')]
+    names.sort(key=lambda f: (_part_range(f)[0], -_part_range(f)[1]))
+    live, covered = [], -1
+    for f in names:
+        first, last = _part_range(f)
+        if first > covered:
+            live.append(f)
+            covered = last
+    return live
+
+
+def _ticker_tables(df, schema):
+    """
+    (ticker, table) for each ticker in `df`, in ticker order with each
+    ticker's rows in their order in `df`.
+
+    The frame is converted to Arrow once and sliced per ticker; converting
+    each ticker's rows separately costs more than writing them. Symbols are
+    dictionary-encoded per slice, so each file's dictionary only holds the
+    values present in it, whatever categories the caller's frame had.
+    """
+    symbols = [f.name for f in schema if pa.types.is_dictionary(f.type)]
+    plain = pa.schema([pa.field(f.name, pa.string()) if f.name in symbols else f for f in schema])
+    df = df[schema.names].astype(dict.fromkeys(symbols, str))
+    df = df.sort_values('Ticker', kind='mergesort', ignore_index=True)
+    table = pa.Table.from_pandas(df, schema=plain, preserve_index=False)
+    tickers = df['Ticker'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1]]) if len(df) else []
+    ends = np.r_[starts[1:], len(df)]
+    for start, end in zip(starts, ends):
+        part = table.slice(start, end - start)
+        columns = [pc.dictionary_encode(part[name]) if name in symbols else part[name]
+                   for name in schema.names]
+        yield tickers[start], pa.Table.from_arrays(columns, schema=schema)
+
+
+def clear_partitions(root):
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+
+
+def remove_partition(root, ticker):
+    tdir = os.path.join(root, str(ticker))
+    if os.path.isdir(tdir):
+        shutil.rmtree(tdir)
+
+
+def write_partitions(df, root, schema, replace=True):
+    """
+    Write one Parquet file per ticker in `df`. With replace=True the store at
+    `root` is emptied first; otherwise only the tickers in `df` are replaced
+    and every other ticker is left as it is.
+    """
+    if replace:
+        clear_partitions(root)
+    for ticker, table in _ticker_tables(df, schema):
+        remove_partition(root, ticker)
+        tdir = os.path.join(root, ticker)
+        os.makedirs(tdir)
+        pq.write_table(table, os.path.join(tdir, 'part-00000.parquet'))
+
+
+# A ticker's part files in the cleaned store are merged back into one once
+# it has more than this many, so reads open a bounded number of files
+# however many incremental runs have appended to it.
+COMPACT_PARTS = 8
+
+
+def append_partitions(df, root, schema, compact=False):
+    """
+    Add `df` to the store at `root` as a new part file per ticker.
+
+    Existing part files are never opened for writing. With compact=True, a
+    ticker that ends up with more than COMPACT_PARTS files is compacted (see
+    compact_partition()).
+    """
+    for ticker, table in _ticker_tables(df, schema):
+        tdir = os.path.join(root, ticker)
+        os.makedirs(tdir, exist_ok=True)
+        pq.write_table(table, os.path.join(tdir, f'part-{_next_part(tdir):05d}.parquet'))
+        if compact and len(_live_parts(tdir)) > COMPACT_PARTS:
+            compact_partition(root, ticker, schema)
+
+
+def compact_partition(root, ticker, schema):
+    """
+    Merge the part files of `ticker` into one.
+
+    Parts are appended in date order, so concatenating them in order keeps
+    the rows sorted. The merged file is named after the range of parts it
+    holds (part-00000-00008.parquet) and moved into place in one rename;
+    from then on readers skip the parts it holds, which are removed after.
+    A crash at any point leaves each row in exactly one file that is read.
+    """
+    tdir = os.path.join(root, str(ticker))
+    parts = _live_parts(tdir)
+    if len(parts) > 1:
+        table = pa.concat_tables(pq.read_table(os.path.join(tdir, f), schema=schema)
+                                 for f in parts)
+        tmp = os.path.join(tdir, 'compact.tmp')
+        pq.write_table(table.unify_dictionaries().combine_chunks(), tmp)
+        first, last = _part_range(parts[0])[0], _part_range(parts[-1])[1]
+        os.replace(tmp, os.path.join(tdir, f'part-{first:05d}-{last:05d}.parquet'))
+    live = _live_parts(tdir)
+    for f in os.listdir(tdir):
+        if f.startswith('part-') and f.endswith('.parquet') and f not in live:
+            os.remove(os.path.join(tdir, f))
+
+
+def read_partitions(root, schema, columns=None, start=None, end=None, tickers=None,
+                    as_schema=None):
+    """
+    Read the store at `root` back into a DataFrame sorted by Ticker, Date.
+
+    Only the requested columns are decoded, and the Date range is pushed down
+    to the Parquet row-group statistics so out-of-range pages are skipped.
+    Names from CALENDAR_COLUMNS in `columns` are derived from Date. With
+    `as_schema`, columns are cast to its types and the frame is a read-only
+    view of the Arrow buffers (see _shared_frame()).
+    """
+    derived = [c for c in columns or () if c in CALENDAR_COLUMNS]
+    if derived:
+        stored = [c for c in columns if c not in CALENDAR_COLUMNS]
+        df = read_partitions(root, schema, list(dict.fromkeys(stored + ['Date'])),
+                             start, end, tickers, as_schema)
+        for c in derived:
+            df[c] = CALENDAR_COLUMNS[c](df['Date'])
+        return df[list(columns)]
+
+    files = _part_files(root, tickers, None if start is None else pd.Timestamp(start))
+    if not files:
+        table = schema.empty_table()
+        if columns is not None:
+            table = table.select(list(columns))
+        return _to_frame(_cast(table, as_schema), as_schema)
+    dataset = ds.dataset(files, schema=schema, format='parquet', filesystem=_FS)
+
+    expr = None
+    if start is not None:
+        expr = ds.field('Date') >= pa.scalar(pd.Timestamp(start), pa.timestamp('ns'))
+    if end is not None:
+        cond = ds.field('Date') <= pa.scalar(pd.Timestamp(end), pa.timestamp('ns'))
+        expr = cond if expr is None else expr & cond
+
+    table = dataset.to_table(
+        columns=list(columns) if columns is not None else None, filter=expr,
+    )
+    return _to_frame(_cast(table, as_schema), as_schema)
+
+
+def _to_frame(table, as_schema):
+    return table.to_pandas() if as_schema is None else _shared_frame(table)
+
+
+def _shared_frame(table):
+    """
+    Convert `table` without copying: each column becomes one contiguous
+    Arrow buffer and every pandas column is a read-only NumPy view of it.
+
+    Float nulls are written as NaN first, since a column with a validity
+    bitmap would be copied. Frames built this way are meant to be shared
+    between dashboard sessions; writing into one raises instead of silently
+    changing what every other session sees.
+    """
+    table = table.combine_chunks()
+    for i, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type) and table.column(i).null_count:
+            filled = pc.fill_null(table.column(i), pa.scalar(float('nan'), field.type))
+            table = table.set_column(i, field, filled)
+    return table.to_pandas(split_blocks=True)
+
+
+def _cast(table, as_schema):
+    if as_schema is None:
+        return table
+    return table.cast(pa.schema([
+        as_schema.field(f.name) if f.name in as_schema.names else f for f in table.schema
+    ]))
+
+
+def _file_date_bounds(path):
+    meta = pq.read_metadata(path)
+    col = meta.schema.names.index('Date')
+    lo, hi = [], []
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            dates = pq.read_table(path, columns=['Date'])['Date']
+            return pd.Timestamp(pc.min(dates).as_py()), pd.Timestamp(pc.max(dates).as_py())
+        lo.append(pd.Timestamp(stats.min))
+        hi.append(pd.Timestamp(stats.max))
+    return min(lo, default=pd.NaT), max(hi, default=pd.NaT)
+
+
+def date_bounds(root):
+    """
+    Earliest and latest Date in the store at `root`, from the Parquet footer
+    statistics: no column data is read. (NaT, NaT) for an empty store.
+    """
+    bounds = [_file_date_bounds(f) for f in _part_files(root)]
+    if not bounds:
+        return pd.NaT, pd.NaT
+    return min(lo for lo, _ in bounds), max(hi for _, hi in bounds)
+
+
+def last_dates(root):
+    """
+    Latest stored Date per ticker, as a Series indexed by ticker symbol, from
+    the footer statistics of each ticker's last part file: parts are appended
+    in date order.
+    """
+    last = {}
+    for ticker in tickers(root):
+        files = _part_files(root, [ticker])
+        if files:
+            last[ticker] = _file_date_bounds(files[-1])[1]
+    return pd.Series(last, dtype='datetime64[ns]', name='Date').rename_axis('Ticker')
+
+
+def tickers(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+
+def write_raw(df, root=RAW_DIR, replace=True):
+    write_partitions(df, root, RAW_SCHEMA, replace)
+
+
+def append_raw(df, root=RAW_DIR):
+    append_partitions(df, root, RAW_SCHEMA)
+
+
+def read_raw(columns=None, start=None, end=None, tickers=None, root=RAW_DIR):
+    return read_partitions(root, RAW_SCHEMA, columns, start, end, tickers)
+
+
+def write_cleaned(df, root=CLEANED_DIR, replace=True):
+    write_partitions(df, root, CLEANED_SCHEMA, replace)
+
+
+def append_cleaned(df, root=CLEANED_DIR):
+    append_partitions(df, root, CLEANED_SCHEMA, compact=True)
+
+
+def read_cleaned(columns=None, start=None, end=None, tickers=None, root=CLEANED_DIR,
+                 compact=False):
+    """Read the cleaned store; compact=True returns the FRAME_SCHEMA layout."""
+    return read_partitions(root, CLEANED_SCHEMA, columns, start, end, tickers,
+                           FRAME_SCHEMA if compact else None)
+
+
+def frame_memory(df):
+    """Bytes `df` occupies (deep) per 1,000 ticker-years of daily bars."""
+    span = df.groupby('Ticker', observed=True)['Date'].agg(['min', 'max'])
+    ticker_years = ((span['max'] - span['min']).dt.days.sum() + len(span)) / 365.25
+    return df.memory_usage(deep=True, index=True).sum() / ticker_years * 1000
+
+
+def write_rollup(df, freq, replace=True):
+    """
+    Write the `freq` rollup bars in `df`. With replace=True the store is
+    emptied first; otherwise only the tickers in `df` are replaced.
+    """
+    root = ROLLUP_DIRS[freq]
+    if replace:
+        clear_partitions(root)
+    for ticker, table in _ticker_tables(df, ROLLUP_SCHEMA):
+        remove_partition(root, ticker)
+        _write_bars(root, ticker, table)
+
+
+def update_rollup(df, freq):
+    """
+    Continue each ticker's `freq` rollup with its bars in `df`, which start
+    at its current period (see rollups.extend_rollup()). Older periods are
+    left as they are.
+    """
+    for ticker, table in _ticker_tables(df, ROLLUP_SCHEMA):
+        _write_bars(ROLLUP_DIRS[freq], ticker, table)
+
+
+def _write_bars(root, ticker, table):
+    # Every bar but the last belongs to a closed period and is appended as a
+    # part file; the last one becomes the open bar (see _open_bar()).
+    tdir = os.path.join(root, ticker)
+    os.makedirs(tdir, exist_ok=True)
+    n = _next_part(tdir)
+    if table.num_rows > 1:
+        pq.write_table(table.slice(0, table.num_rows - 1), os.path.join(tdir, f'part-{n:05d}.parquet'))
+        n += 1
+        if len(_live_parts(tdir)) > COMPACT_PARTS:
+            compact_partition(root, ticker, ROLLUP_SCHEMA)
+    tmp = os.path.join(tdir, 'open.tmp')
+    pq.write_table(table.slice(table.num_rows - 1), tmp)
+    os.replace(tmp, os.path.join(tdir, f'open-{n:05d}.parquet'))
+    for f in os.listdir(tdir):
+        if f.startswith('open-') and f != f'open-{n:05d}.parquet':
+            os.remove(os.path.join(tdir, f))
+
+
+def last_rollup_bars(freq, tickers):
+    """The last `freq` bar of each of `tickers` that has one, sorted by Ticker."""
+    root = ROLLUP_DIRS[freq]
+    files = [parts[-1] for parts in (_part_files(root, [t]) for t in sorted(tickers)) if parts]
+    if not files:
+        return ROLLUP_SCHEMA.empty_table().to_pandas()
+    table = ds.dataset(files, schema=ROLLUP_SCHEMA, format='parquet', filesystem=_FS).to_table()
+    return table.to_pandas().groupby('Ticker', observed=True, sort=False).tail(1)
+
+
+def read_rollup(freq, columns=None, start=None, end=None, tickers=None, compact=False):
+    """Read the `freq` rollup store; compact=True returns the FRAME_SCHEMA layout."""
+    return read_partitions(ROLLUP_DIRS[freq], ROLLUP_SCHEMA, columns, start, end, tickers,
+                           FRAME_SCHEMA if compact else None)
+
+
+def query_bars(resolution='D', tickers=None, columns=None, start=None, end=None):
+    """
+    Bars at `resolution` ('D' for the cleaned store, or a ROLLUP_DIRS key)
+    for `tickers` with start <= Date <= end, in the FRAME_SCHEMA layout.
+
+    Only those tickers' partitions are opened, the date range is pushed down
+    to the row-group statistics and only `columns` are decoded, so the result
+    holds what one view shows and nothing more.
+    """
+    if resolution == 'D':
+        return read_cleaned(columns, start, end, tickers, compact=True)
+    if columns is not None:
+        columns = [c for c in columns if c in ROLLUP_SCHEMA.names or c in CALENDAR_COLUMNS]
+    return read_rollup(resolution, columns, start, end, tickers, compact=True)
+
+
+def write_summary(df, path=SUMMARY_PATH):
+    df.to_csv(path, index=False)
+
+
+def read_summary(path=SUMMARY_PATH):
+    return pd.read_csv(path)
+
+
+# Everything the dashboard reads, for the manifest and the version token.
+DASHBOARD_PATHS = (CLEANED_DIR, *ROLLUP_DIRS.values(), SUMMARY_PATH)
+
+
+def _files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            yield from sorted(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs)
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(paths=DASHBOARD_PATHS, path=MANIFEST_PATH):
+    """
+    Record the content hash of every file the dashboard reads, and a version
+    token derived from those hashes, in `path`.
+
+    Files whose size and mtime match the previous manifest keep their hash,
+    so after an incremental append only the new part files are read. The
+    manifest is replaced atomically and written last, so readers never see
+    a version for half-written data.
+    """
+    old = _read_manifest(path).get('files', {})
+    files = {}
+    for f in _files(paths):
+        st = os.stat(f)
+        key = f.replace(os.sep, '/')
+        prev = old.get(key)
+        if prev and prev['size'] == st.st_size and prev['mtime_ns'] == st.st_mtime_ns:
+            digest = prev['sha1']
+        else:
+            digest = _sha1(f)
+        files[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': digest}
+
+    token = hashlib.sha1()
+    for key in sorted(files):
+        token.update(f"{key}:{files[key]['sha1']};".encode())
+    version = token.hexdigest()[:12]
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({'version': version, 'files': files}, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    return version
+
+
+def _stat_version(paths):
+    h = hashlib.sha1()
+    for f in _files(paths):
+        st = os.stat(f)
+        h.update(f'{f}:{st.st_size}:{st.st_mtime_ns};'.encode())
+    return h.hexdigest()[:12]
+
+
+_manifest_seen = {}
+
+
+def data_version(path=MANIFEST_PATH):
+    """
+    Version token of the data the dashboard reads, as recorded in the
+    manifest by clean_data.py.
+
+    The manifest is only re-parsed when its own size or mtime changes, so
+    calling this on every rerun costs one stat(). Without a manifest, a
+    token built from the data files' names, sizes and mtimes is used.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return _stat_version(DASHBOARD_PATHS)
+    key = (st.st_size, st.st_mtime_ns)
+    if _manifest_seen.get('key') != key:
+        _manifest_seen['version'] = _read_manifest(path).get('version', '')
+        _manifest_seen['key'] = key
+    return _manifest_seen['version']
+
+
+def write_state(df, path=STATE_PATH):
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+
+def read_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path, memory_map=True).to_pandas()
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger('dashboard.timing')
+
+_NOOP = nullcontext()
+
+
+class Spans:
+    """
+    Named wall-clock spans collected over one dashboard rerun.
+
+    When disabled, span() hands back one shared no-op context manager, so an
+    instrumented block costs an attribute lookup and a call and nothing is
+    recorded.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._start = time.perf_counter()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NOOP
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((name, time.perf_counter() - t0))
+
+    def total(self):
+        return time.perf_counter() - self._start
+
+    def as_rows(self):
+        """[(name, milliseconds)], in the order the spans finished, plus the total."""
+        rows = [(name, seconds * 1e3) for name, seconds in self.records]
+        return rows + [('total', self.total() * 1e3)]
+
+
+class SpanMetrics:
+    """Process-wide count, sum and max of every span name, across all sessions."""
+
+    def __init__(self):
+        self.reruns = 0
+        self.gauges = {}
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def set_gauges(self, **values):
+        """Latest values of process-wide gauges, exported as dashboard_<name>."""
+        with self._lock:
+            self.gauges.update(values)
+
+    def record(self, spans):
+        total = spans.total()
+        with self._lock:
+            self.reruns += 1
+            for name, seconds in spans.records + [('total', total)]:
+                count, sum_, max_ = self._spans.get(name, (0, 0.0, 0.0))
+                self._spans[name] = (count + 1, sum_ + seconds, max(max_, seconds))
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            spans = sorted(self._spans.items())
+            gauges = sorted(self.gauges.items())
+            reruns = self.reruns
+        lines = [
+            '# HELP dashboard_reruns_total Dashboard reruns with timing enabled.',
+            '# TYPE dashboard_reruns_total counter',
+            f'dashboard_reruns_total {reruns}',
+            '# HELP dashboard_span_seconds Time spent in each dashboard span.',
+            '# TYPE dashboard_span_seconds summary',
+        ]
+        for name, (count, sum_, _) in spans:
+            lines.append(f'dashboard_span_seconds_count{{span="{name}"}} {count}')
+            lines.append(f'dashboard_span_seconds_sum{{span="{name}"}} {sum_:.6f}')
+        lines += [
+            '# HELP dashboard_span_max_seconds Slowest single run of each span.',
+            '# TYPE dashboard_span_max_seconds gauge',
+        ]
+        for name, (_, _, max_) in spans:
+            lines.append(f'dashboard_span_max_seconds{{span="{name}"}} {max_:.6f}')
+        for name, value in gauges:
+            lines += [f'# TYPE dashboard_{name} gauge', f'dashboard_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def process_rss():
+    """
+    Resident set size of this process in bytes: the peak where /proc is
+    missing, and 0 where neither is available (Windows has no `resource`).
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def log_spans(spans, **fields):
+    """Write one rerun's spans as a single JSON log line on `dashboard.timing`."""
+    record = dict(fields, spans_ms={n: round(ms, 3) for n, ms in spans.as_rows()})
+    log.info(json.dumps(record))
+
+
+def serve_metrics(metrics, port, host='0.0.0.0'):
+    """Serve `metrics` at http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server